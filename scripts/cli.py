@@ -0,0 +1,71 @@
+# scripts/cli.py
+# Single entry point: python -m scripts.cli <command>. Nothing heavy is imported
+# here; each handler imports its module (and so pandas/cptac/GEOparse/sklearn)
+# only when that command runs, so --help and small fetches start fast.
+import argparse
+import importlib
+import sys
+from scripts.utils import LOG, setup
+
+SOURCES = ["tcga", "geo", "cptac", "tcia", "pride", "nhanes"]
+ETL_STEPS = ["nhanes", "join", "scale", "save"]
+
+def cmd_fetch(args):
+    for src in args.sources or SOURCES:
+        LOG.info("Fetching %s", src)
+        importlib.import_module(f"scripts.download.download_{src}").main()
+    return 0
+
+def cmd_etl(args):
+    from scripts.utils import ensure_dirs
+    from scripts.etl import etl_brain
+    if not args.steps:
+        etl_brain.main()
+        return 0
+    ensure_dirs()
+    for step in ETL_STEPS:  # always in pipeline order
+        if step in args.steps:
+            getattr(etl_brain, f"run_{step}")()
+    return 0
+
+def cmd_pipeline(args):
+    from scripts import pipeline
+    return pipeline.main(args.rest)
+
+def cmd_run(args):
+    from scripts import orchestrate
+    return orchestrate.main(args.rest)
+
+def build_parser():
+    ap = argparse.ArgumentParser(prog="python -m scripts.cli", description="Brain cancer multi-omics fetch + ETL")
+    sub = ap.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("fetch", help="download one or more sources (default: all, serially)")
+    p.add_argument("sources", nargs="*", metavar="SOURCE",
+                   help=f"any of {', '.join(SOURCES)}")
+    p.set_defaults(func=cmd_fetch)
+    p = sub.add_parser("etl", help="run the ETL (default: all steps)")
+    p.add_argument("steps", nargs="*", metavar="STEP",
+                   help=f"any of {', '.join(ETL_STEPS)}")
+    p.set_defaults(func=cmd_etl)
+    p = sub.add_parser("pipeline", help="cached pipeline (scripts.pipeline); extra args are passed on", add_help=False)
+    p.set_defaults(func=cmd_pipeline, passthrough=True)
+    p = sub.add_parser("run", help="fetch everything concurrently, then ETL (scripts.orchestrate)", add_help=False)
+    p.set_defaults(func=cmd_run, passthrough=True)
+    return ap
+
+def main(argv=None):
+    ap = build_parser()
+    args, rest = ap.parse_known_args(argv)
+    if rest and not getattr(args, "passthrough", False):
+        ap.error(f"unrecognized arguments: {' '.join(rest)}")
+    args.rest = rest
+    # checked here: argparse rejects an empty nargs="*" list when choices= is set
+    for name, allowed in (("sources", SOURCES), ("steps", ETL_STEPS)):
+        bad = [v for v in getattr(args, name, None) or [] if v not in allowed]
+        if bad:
+            ap.error(f"unknown {name} {bad}; choose from {', '.join(allowed)}")
+    setup()
+    return args.func(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,14 +1,14 @@
 # scripts/download/download_cptac.py
-import cptac
 from pathlib import Path
-from scripts.utils import LOG
+from scripts.utils import LOG, cached_call, setup, write_table
 
 OUTDIR = Path("data/CPTAC")
-OUTDIR.mkdir(parents=True, exist_ok=True)
 
 def download_brca_or_available():
+    import cptac  # heavy; only when this fetch runs
+    OUTDIR.mkdir(parents=True, exist_ok=True)
     LOG.info("Listing CPTAC datasets")
-    datasets = cptac.list_datasets()
+    datasets = cached_call("cptac.list_datasets", cptac.list_datasets)
     LOG.info(f"Available: {datasets}")
     # CPTAC may not have brain; attempt to download brain proteomics if exists, otherwise leave
     try:
@@ -18,10 +18,18 @@ def download_brca_or_available():
         cptac.download()
         brca = cptac.Brca()
         proteomics = brca.get_proteomics()
-        proteomics.to_csv(OUTDIR/"proteomics_brca.csv")
+        if proteomics.columns.nlevels > 1:
+            # (gene, database id) multi-index -> "gene_dbid"
+            proteomics.columns = ["_".join(str(x) for x in c if str(x) not in ("", "nan")) for c in proteomics.columns]
+        proteomics = proteomics.rename_axis("patient_id").reset_index()
+        write_table(proteomics, OUTDIR/"proteomics_brca.parquet", {"patient_id": "string"}, numeric="float32")
         LOG.info("Saved CPTAC proteomics (BRCA placeholder)")
     except Exception as e:
         LOG.warning("CPTAC download error or dataset not present: %s", e)
 
-if __name__ == "__main__":
+def main():
     download_brca_or_available()
+
+if __name__ == "__main__":
+    setup()
+    main()
@@ -1,27 +1,59 @@
 # scripts/download/download_geo.py
-import GEOparse
+import os
+import shutil
 from pathlib import Path
-from scripts.utils import LOG
+from scripts.utils import LOG, setup
+from scripts.download.geo_ingest import ingest, expression_stem
+from scripts.etl.expr_matrix import matrix_files
 
 OUTDIR = Path("data/GEO")
-OUTDIR.mkdir(parents=True, exist_ok=True)
 
-def download_gse(gse_id):
-    LOG.info(f"Downloading {gse_id}")
-    gse = GEOparse.get_GEO(geo=gse_id, destdir=str(OUTDIR))
-    # attempt to write expression matrix
+def _link(src, dest):
+    """Hard-link src to dest (copy across filesystems), replacing dest."""
+    tmp = dest.with_name(dest.name + ".tmp")
+    tmp.unlink(missing_ok=True)
     try:
-        gse_table = gse.pivot_samples("VALUE")
-        gse_table.reset_index(inplace=True)
-        gse_table.to_csv(OUTDIR/f"{gse_id}_expr.csv", index=False)
-        LOG.info("Saved GEO expression")
-    except Exception as e:
-        LOG.warning("Could not pivot expression: %s", e)
-    return gse
+        os.link(src, tmp)
+    except OSError:
+        shutil.copy2(src, tmp)
+    os.replace(tmp, dest)
 
-if __name__ == "__main__":
-    # user: list GSEs related to GBM/LGG
-    gse_list = ["GSE4290","GSE16011"]  # examples; replace as needed
-    for g in gse_list:
-        download_gse(g)
+def export_matrix(gse_id, cache):
+    """Expose the cached matrix to the ETL as <gse>_expr.npy (+ sidecars) without copying it."""
+    src = expression_stem(cache)
+    stem = OUTDIR / f"{gse_id}_expr"
+    files = matrix_files(src)
+    if not files:
+        LOG.warning("%s has no expression matrix", gse_id)
+        return None
+    for f in files:
+        dest = OUTDIR / f.name.replace(src.name, stem.name, 1)
+        if dest.exists() and (os.path.samefile(f, dest) or dest.stat().st_mtime >= f.stat().st_mtime):
+            continue
+        _link(f, dest)
+    LOG.info("GEO expression %s -> %s.npy", gse_id, stem)
+    return stem
+
+def download_gse(gse_id):
+    return download_all([gse_id])[gse_id]
+
+def download_all(gse_ids):
+    """Fetch and parse the series concurrently (cached per SOFT checksum); returns {gse_id: cache dir}."""
+    OUTDIR.mkdir(parents=True, exist_ok=True)
+    LOG.info(f"Downloading {', '.join(gse_ids)}")
+    caches = ingest(gse_ids, destdir=OUTDIR)
+    for gse_id, cache in caches.items():
+        if cache is not None:
+            export_matrix(gse_id, cache)
+    return caches
+
+# user: list GSEs related to GBM/LGG
+GSE_LIST = ["GSE4290","GSE16011"]  # examples; replace as needed
+
+def main():
+    download_all(GSE_LIST)
     LOG.info("GEO downloads done")
+
+if __name__ == "__main__":
+    setup()
+    main()
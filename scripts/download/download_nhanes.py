@@ -1,28 +1,100 @@
 # scripts/download/download_nhanes.py
-import requests
+# NHANES public-use .XPT files: a catalogue of cycles (file naming differs per
+# cycle) and a concurrent fetch of cycles x file codes, each streamed to disk.
+import os
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from scripts.utils import LOG
+from scripts.utils import LOG, env, http_get, setup
 
 OUTDIR = Path("data/EXTERNAL/nhanes")
-OUTDIR.mkdir(parents=True, exist_ok=True)
 
-BASE = "https://wwwn.cdc.gov/Nchs/Nhanes/"
+BASE = "https://wwwn.cdc.gov/Nchs/Data/Nhanes/Public/"
+
+# cycle -> (file prefix, file suffix): DEMO in 2017-2018 is DEMO_J.xpt, in the
+# 2017-March 2020 pre-pandemic release P_DEMO.xpt, in 1999-2000 plain DEMO.xpt.
+CYCLES = {
+    "1999-2000": ("", ""),
+    "2001-2002": ("", "_B"),
+    "2003-2004": ("", "_C"),
+    "2005-2006": ("", "_D"),
+    "2007-2008": ("", "_E"),
+    "2009-2010": ("", "_F"),
+    "2011-2012": ("", "_G"),
+    "2013-2014": ("", "_H"),
+    "2015-2016": ("", "_I"),
+    "2017-2018": ("", "_J"),
+    "2017-2020": ("P_", ""),  # pre-pandemic (2017-March 2020)
+    "2021-2023": ("", "_L"),
+}
+
+def file_name(cycle, code):
+    if cycle not in CYCLES:
+        raise ValueError(f"Unknown NHANES cycle {cycle}; known: {', '.join(CYCLES)}")
+    prefix, suffix = CYCLES[cycle]
+    return f"{prefix}{code}{suffix}"
+
+def file_url(cycle, code):
+    return f"{BASE}{cycle[:4]}/DataFiles/{file_name(cycle, code)}.xpt"
+
+def _http_date(ts):
+    from email.utils import formatdate
+    return formatdate(ts, usegmt=True)
+
+def fetch_file(cycle, code, outdir=OUTDIR, chunk_size=1024*1024):
+    """Stream one table to outdir/<name>.XPT; returns the path, or None when not published."""
+    url = file_url(cycle, code)
+    dest = Path(outdir) / f"{file_name(cycle, code)}.XPT"
+    headers = {}
+    if dest.exists():
+        # unchanged upstream -> 304, nothing is transferred
+        headers["If-Modified-Since"] = _http_date(dest.stat().st_mtime)
+    with http_get(url, headers=headers, stream=True) as r:
+        if r.status_code == 304:
+            LOG.info("Up to date: %s", dest)
+            return dest
+        # a missing table comes back as an HTML page, sometimes with status 200
+        if r.status_code != 200 or "html" in r.headers.get("Content-Type", ""):
+            LOG.warning("Not found: %s status %s", url, r.status_code)
+            return None
+        part = dest.with_name(dest.name + ".part")
+        with open(part, "wb") as fh:
+            for chunk in r.iter_content(chunk_size):
+                fh.write(chunk)
+        os.replace(part, dest)
+    LOG.info("Saved %s", dest)
+    return dest
+
+def bulk_fetch(cycles=None, filecodes=None, outdir=OUTDIR, workers=None):
+    """Fetch every cycle x file code concurrently; returns {(cycle, code): path or None}."""
+    cycles = list(cycles or CYCLES)
+    filecodes = list(filecodes or ["DEMO", "BMX"])
+    workers = workers or int(env("NHANES_WORKERS", 8))
+    Path(outdir).mkdir(parents=True, exist_ok=True)
+    jobs = [(c, f) for c in cycles for f in filecodes]
+    LOG.info("Fetching %d NHANES tables (%d cycles x %d codes) on %d threads",
+             len(jobs), len(cycles), len(filecodes), workers)
+
+    def one(job):
+        try:
+            return fetch_file(*job, outdir=outdir)
+        except Exception as e:
+            LOG.warning("NHANES %s %s failed: %s", *job, e)
+            return None
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = dict(zip(jobs, pool.map(one, jobs)))
+    LOG.info("NHANES: %d of %d tables available", sum(p is not None for p in results.values()), len(jobs))
+    return results
 
 def download_cycle(cycle="2017-2018", filecodes=None):
-    if filecodes is None:
-        filecodes = ["DEMO", "BMX"]  # demographics, body measures
-    for f in filecodes:
-        fname = f"{f}_{cycle[-1]}.XPT"  # pattern used earlier; validate per file
-        url = f"{BASE}{cycle}/{fname}"
-        LOG.info(f"Attempt download: {url}")
-        r = requests.get(url, timeout=30)
-        if r.status_code == 200:
-            p = OUTDIR / fname
-            with open(p, "wb") as fh:
-                fh.write(r.content)
-            LOG.info(f"Saved {p}")
-        else:
-            LOG.warning(f"Not found: {url} status {r.status_code}")
+    return bulk_fetch([cycle], filecodes or ["DEMO", "BMX"])  # demographics, body measures
+
+def main():
+    # NHANES_CYCLES / NHANES_FILES: comma-separated; CBC carries WBC, RBC, hemoglobin
+    cycles = [c.strip() for c in env("NHANES_CYCLES", "2017-2018").split(",") if c.strip()]
+    codes = [c.strip() for c in env("NHANES_FILES", "DEMO,BMX,CBC").split(",") if c.strip()]
+    bulk_fetch(cycles, codes)
 
 if __name__ == "__main__":
-    download_cycle("2017-2018", ["DEMO","BMX","LAB10"])
+    setup()
+    main()
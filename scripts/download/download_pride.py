@@ -1,30 +1,28 @@
 # scripts/download/download_pride.py
-import requests, pandas as pd
 from pathlib import Path
-from scripts.utils import LOG, env
+from scripts.utils import LOG, env, setup, write_table
+from scripts.download.pride_client import iter_projects
 
 OUTDIR = Path("data/EXTERNAL/pride")
-OUTDIR.mkdir(parents=True, exist_ok=True)
 
-PRIDE_API = "https://www.ebi.ac.uk/pride/ws/archive/v2/projects"
+# typed project columns; nested lists/dicts (keywords, organisms, ...) are stored as JSON strings
+PRIDE_PROJECT_SCHEMA = {
+    "accession": "string", "title": "string", "projectDescription": "string",
+    "submissionType": "category", "submissionDate": "datetime64[ns]", "publicationDate": "datetime64[ns]",
+}
 
 def fetch_pride_projects(query="cancer"):
     LOG.info("Fetching PRIDE projects list (filtered)")
-    params = {"pageSize":100, "page":0, "speciesFilter":"Homo sapiens", "q": query}
-    projects = []
-    while True:
-        r = requests.get(PRIDE_API, params=params, timeout=30)
-        r.raise_for_status()
-        data = r.json()
-        items = data.get("_embedded", {}).get("projects", [])
-        projects.extend(items)
-        if data.get("_links", {}).get("next") is None:
-            break
-        params["page"] += 1
+    projects = list(iter_projects(query, page_size=100, speciesFilter="Homo sapiens"))
+    import pandas as pd
     df = pd.DataFrame(projects)
-    df.to_csv(OUTDIR/"pride_projects_meta.csv", index=False)
+    write_table(df, OUTDIR/"pride_projects_meta.parquet", PRIDE_PROJECT_SCHEMA)
     LOG.info("Saved pride meta")
     return df
 
-if __name__ == "__main__":
+def main():
     fetch_pride_projects("glioblastoma OR glioma")
+
+if __name__ == "__main__":
+    setup()
+    main()
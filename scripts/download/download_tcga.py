@@ -1,49 +1,97 @@
 # scripts/download/download_tcga.py
-import requests, json, os
+import json, os
 from pathlib import Path
-from scripts.utils import LOG, env
+from scripts.utils import LOG, env, setup, write_table
+from scripts.download.gdc_client import iter_hits
 
-GDC_API = "https://api.gdc.cancer.gov"
 OUTDIR = Path("data/TCGA")
 
-def query_tcga_cases(projects=["TCGA-GBM","TCGA-LGG"], data_types=None, fields=None, size=10000):
+CLINICAL_JSON = OUTDIR / "clinical_gbm_lgg.json"
+CLINICAL_TABLE = OUTDIR / "clinical_gbm_lgg.parquet"  # + .csv when TABLE_FORMATS has csv
+CLINICAL_STATE = OUTDIR / "clinical_state.json"  # high-water mark for incremental refresh
+CLINICAL_SCHEMA = {"patient_id": "string", "case_id": "string", "age": "Int64", "gender": "category"}
+CLINICAL_FIELDS = "case_id,submitter_id,updated_datetime,diagnoses.age_at_diagnosis,demographic.gender"
+
+def query_tcga_cases(projects=["TCGA-GBM","TCGA-LGG"], data_types=None, fields=None, page_size=1000,
+                     updated_since=None):
+    """Yield GDC case hits for the given projects, page by page."""
     filters = {
         "op":"in",
-        "content":[ {"field":"cases.project.project_id","value": projects} ]
+        "content":{"field":"cases.project.project_id","value": projects}
     }
-    params = {"filters": json.dumps(filters), "size": size}
-    if fields:
-        params["fields"] = fields
-    r = requests.get(f"{GDC_API}/cases", params=params)
-    r.raise_for_status()
-    return r.json()
-
-def download_clinical(projects=["TCGA-GBM","TCGA-LGG"]):
-    LOG.info("Fetching TCGA clinical via GDC API (cases)")
-    # fields to get
-    fields = "case_id,submitter_id,diagnoses.age_at_diagnosis,demographic.gender"
-    res = query_tcga_cases(projects=projects, fields=fields)
-    records = res.get('data', {}).get('hits', [])
-    out = OUTDIR / "clinical_gbm_lgg.json"
-    with open(out, "w") as f:
-        json.dump(records, f)
-    LOG.info(f"Written {out}")
-    # convert to CSV basic table
+    if updated_since:
+        # >= rather than >: rows at the mark are re-merged by case_id, never lost
+        filters = {"op":"and", "content":[
+            filters,
+            {"op":">=", "content":{"field":"updated_datetime","value": updated_since}},
+        ]}
+    return iter_hits("cases", filters, fields, page_size=page_size)
+
+def _clinical_row(c):
+    diag = (c.get('diagnoses') or [{}])[0]
+    return {
+        "patient_id": c.get('submitter_id') or c.get('case_id'),
+        "case_id": c.get('case_id'),
+        "age": diag.get("age_at_diagnosis"),
+        "gender": c.get("demographic",{}).get("gender")
+    }
+
+def _write_clinical(cases):
+    """Stream case records into the JSON array and write the basic typed table; returns (n, max updated_datetime)."""
     import pandas as pd
-    rows = []
-    for c in records:
-        rid = c.get('submitter_id') or c.get('case_id')
-        diag = c.get('diagnoses',[{}])[0]
-        rows.append({
-            "patient_id": rid,
-            "age": diag.get("age_at_diagnosis"),
-            "gender": c.get("demographic",{}).get("gender")
-        })
-    pd.DataFrame(rows).to_csv(OUTDIR/"clinical_gbm_lgg.csv", index=False)
-    LOG.info("Saved clinical CSV")
+    rows, high = [], None
+    tmp_json = CLINICAL_JSON.with_suffix(".json.tmp")
+    with open(tmp_json, "w") as fj:
+        fj.write("[")
+        for c in cases:
+            fj.write(("," if rows else "") + json.dumps(c))
+            rows.append(_clinical_row(c))
+            upd = c.get("updated_datetime")
+            if upd and (high is None or upd > high):
+                high = upd
+        fj.write("]")
+    os.replace(tmp_json, CLINICAL_JSON)
+    df = pd.DataFrame(rows, columns=list(CLINICAL_SCHEMA))
+    write_table(df, CLINICAL_TABLE, CLINICAL_SCHEMA)
+    return len(rows), high
 
-if __name__ == "__main__":
-    ensure = Path("data/TCGA")
-    ensure.mkdir(parents=True, exist_ok=True)
-    download_clinical()
+def _load_state(projects):
+    if not (CLINICAL_STATE.exists() and CLINICAL_JSON.exists()):
+        return None
+    state = json.loads(CLINICAL_STATE.read_text())
+    if sorted(state.get("projects", [])) != sorted(projects):
+        return None  # different project set: the stored table does not cover it
+    return state.get("high_water")
+
+def download_clinical(projects=["TCGA-GBM","TCGA-LGG"], incremental=False):
+    LOG.info("Fetching TCGA clinical via GDC API (cases)")
+    mark = _load_state(projects) if incremental else None
+    if mark is None:
+        n, high = _write_clinical(query_tcga_cases(projects=projects, fields=CLINICAL_FIELDS))
+        LOG.info(f"Written {CLINICAL_JSON} ({n} cases, full pull)")
+    else:
+        LOG.info("Incremental refresh: cases updated since %s", mark)
+        with open(CLINICAL_JSON) as f:
+            cases = {c.get("case_id"): c for c in json.load(f)}
+        changed = 0
+        for c in query_tcga_cases(projects=projects, fields=CLINICAL_FIELDS, updated_since=mark):
+            if c.get("case_id") in cases and (c.get("updated_datetime") or "") <= mark:
+                continue  # the case at the mark itself (>= filter), already stored
+            cases[c.get("case_id")] = c
+            changed += 1
+        if not changed:
+            LOG.info("No TCGA clinical changes since %s", mark)
+            return
+        n, high = _write_clinical(cases.values())
+        LOG.info(f"Merged {changed} updated cases into {CLINICAL_JSON} ({n} cases)")
+    CLINICAL_STATE.write_text(json.dumps({"projects": sorted(projects), "high_water": high or mark}))
+    LOG.info("Saved clinical table")
+
+def main():
+    OUTDIR.mkdir(parents=True, exist_ok=True)
+    download_clinical(incremental=True)  # falls back to a full pull when no state exists
     LOG.info("TCGA metadata fetch complete. For large files use gdc-client with manifest from GDC portal.")
+
+if __name__ == "__main__":
+    setup()
+    main()
@@ -1,21 +1,31 @@
 # scripts/download/download_tcia.py
-from tcia_utils import nbia
-import pandas as pd
 from pathlib import Path
-from scripts.utils import LOG, env
+from scripts.utils import LOG, cached_call, env, setup, write_table
 
 OUTDIR = Path("data/TCIA")
-OUTDIR.mkdir(parents=True, exist_ok=True)
+
+# typed columns of nbia.getSeries; anything else is stored as string
+TCIA_SERIES_SCHEMA = {
+    "SeriesInstanceUID": "string", "StudyInstanceUID": "string", "PatientID": "string",
+    "Collection": "category", "Modality": "category", "BodyPartExamined": "category",
+    "Manufacturer": "category", "SeriesNumber": "Int64", "ImageCount": "Int64", "FileSize": "Int64",
+}
 
 def fetch_series(collection="TCGA-GBM"):
     LOG.info(f"Fetching TCIA series for {collection}")
     try:
-        series = nbia.getSeries(collection=collection)
+        import pandas as pd
+        from tcia_utils import nbia  # heavy; only when this fetch runs
+        series = cached_call("nbia.getSeries", nbia.getSeries, collection=collection)
         df = pd.DataFrame(series)
-        df.to_csv(OUTDIR/f"{collection}_series.csv", index=False)
+        write_table(df, OUTDIR/f"{collection}_series.parquet", TCIA_SERIES_SCHEMA)
         LOG.info("Saved TCIA series metadata")
     except Exception as e:
         LOG.error("TCIA fetch error: %s", e)
 
-if __name__ == "__main__":
+def main():
     fetch_series("TCGA-GBM")
+
+if __name__ == "__main__":
+    setup()
+    main()
@@ -0,0 +1,221 @@
+# scripts/download/gdc_bulk.py
+# Concurrent, resumable bulk download of GDC files with a checkpointed manifest.
+# The manifest (CSV) is written once with the queued files; each finished file is
+# then checkpointed by appending to a journal, folded back into the CSV at the end.
+# An interrupted run restarts with finished files skipped (no request sent) and
+# partial ones resumed via Range.
+# Files are md5-verified while streaming and kept in the content-addressed store.
+import csv
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+import requests
+from scripts.utils import LOG, env, http_get
+from scripts.download import store
+from scripts.download.gdc_client import GDC_API
+
+MANIFEST_FIELDS = ["file_id", "file_name", "sample_id", "data_type", "data_format",
+                   "size", "md5", "local_path", "status"]
+
+class Manifest:
+    """Manifest CSV plus an append-only journal (<manifest>.journal, one JSON row per
+    line) of the rows changed since the CSV was last written."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.journal = self.path.with_suffix(self.path.suffix + ".journal")
+        self.rows = {}
+        self._lock = threading.Lock()
+        if self.path.exists():
+            with open(self.path, newline="") as fh:
+                for row in csv.DictReader(fh):
+                    self.rows[row["file_id"]] = row
+        if self.journal.exists():
+            with open(self.journal) as fh:
+                for line in fh:
+                    try:
+                        row = json.loads(line)
+                    except ValueError:
+                        break  # last line cut short by a crash
+                    self.rows[row["file_id"]] = row
+
+    def get(self, file_id):
+        return self.rows.get(file_id)
+
+    def set(self, row):
+        """Record a row in memory only; written by the next compact()."""
+        with self._lock:
+            self.rows[row["file_id"]] = {k: row.get(k, "") for k in MANIFEST_FIELDS}
+
+    def update(self, row):
+        """Record a row and checkpoint it with one appended journal line."""
+        self.set(row)
+        with self._lock, open(self.journal, "a") as fh:
+            fh.write(json.dumps(self.rows[row["file_id"]]) + "\n")
+            fh.flush()
+            os.fsync(fh.fileno())
+
+    def compact(self):
+        """Rewrite the CSV with every row and drop the journal."""
+        with self._lock:
+            tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+            with open(tmp, "w", newline="") as fh:
+                w = csv.DictWriter(fh, fieldnames=MANIFEST_FIELDS)
+                w.writeheader()
+                w.writerows(self.rows.values())
+            os.replace(tmp, self.path)  # atomic: a crash never leaves a half-written manifest
+            self.journal.unlink(missing_ok=True)
+
+def record_from_hit(hit, save_dir):
+    cases = hit.get("cases") or []
+    return {
+        "file_id": hit["file_id"],
+        "file_name": hit["file_name"],
+        "sample_id": cases[0].get("submitter_id", "Unknown") if cases else "Unknown",
+        "data_type": hit.get("data_type"),
+        "data_format": hit.get("data_format"),
+        "size": hit.get("file_size", ""),
+        "md5": hit.get("md5sum", ""),
+        "local_path": str(Path(save_dir) / hit["file_name"]),
+        "status": "pending",
+    }
+
+def is_complete(rec):
+    p = Path(rec["local_path"])
+    if not p.exists():
+        return False
+    return not rec.get("size") or p.stat().st_size == int(rec["size"])
+
+def adopt_existing(rec):
+    """Accept a full-size file already at local_path: md5-checked (when known) and stored.
+
+    A file that fails the check is removed so it is downloaded again from scratch.
+    """
+    path = Path(rec["local_path"])
+    md5 = rec.get("md5") or None
+    if not md5:
+        return True  # nothing to verify against; size matched
+    if store.has(md5) and os.path.samefile(store.object_path(md5), path):
+        return True  # already linked from the store
+    digest = store.hash_prefix(path).hexdigest()
+    if digest != md5:
+        LOG.warning("%s: existing file has md5 %s, expected %s; downloading again",
+                    rec["file_name"], digest, md5)
+        path.unlink()
+        return False
+    store.commit(path, digest, path)
+    return True
+
+def download_file(rec, max_retries=5, chunk_size=1024*1024):
+    """Download one file to rec['local_path'] through the object store.
+
+    Bytes are hashed as they stream in (a resumed '.part' prefix is hashed once
+    first), and the md5 is checked against GDC's md5sum before the file is kept.
+    """
+    path = Path(rec["local_path"])
+    md5 = rec.get("md5") or None
+    if md5 and store.has(md5):
+        store.materialize(md5, path)  # same content already fetched for another project/script
+        return "success"
+    part = store.root() / "tmp" / f"{rec['file_id']}.part"
+    part.parent.mkdir(parents=True, exist_ok=True)
+    expected = int(rec["size"]) if rec.get("size") else None
+    url = f"{GDC_API}/data/{rec['file_id']}"
+    if path.exists() and not part.exists():
+        shutil.move(path, part)  # incomplete file from an older, non-'.part' run: resume it
+    for attempt in range(1, max_retries + 1):
+        offset = part.stat().st_size if part.exists() else 0
+        hasher = store.hash_prefix(part) if offset else hashlib.md5()
+        if expected is not None and offset >= expected:
+            break
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+        try:
+            with http_get(url, stream=True, headers=headers) as r:
+                if r.status_code == 416:
+                    break  # nothing left to send
+                r.raise_for_status()
+                if offset and r.status_code != 206:
+                    offset, hasher = 0, hashlib.md5()  # server ignored Range; start over
+                with open(part, "ab" if offset else "wb") as fh:
+                    for chunk in r.iter_content(chunk_size=chunk_size):
+                        fh.write(chunk)
+                        hasher.update(chunk)
+            break
+        except requests.exceptions.HTTPError as e:
+            LOG.warning("%s: %s", rec["file_name"], e)  # 5xx were already retried by the session
+            return "failed"
+        except (requests.exceptions.ConnectionError,
+                requests.exceptions.Timeout,
+                requests.exceptions.ChunkedEncodingError) as e:
+            wait = 5 * attempt
+            LOG.warning("%s: attempt %d/%d failed (%s); retrying in %ds",
+                        rec["file_name"], attempt, max_retries, e, wait)
+            time.sleep(wait)
+    else:
+        return "failed"
+    got = part.stat().st_size if part.exists() else 0
+    if expected is not None and got != expected:
+        LOG.warning("%s: size mismatch (got %d, expected %d)", rec["file_name"], got, expected)
+        if got > expected:
+            part.unlink()  # cannot be a prefix of the right file
+        return "partial"
+    try:
+        store.commit(part, hasher.hexdigest(), path, expected_md5=md5)
+    except store.ChecksumMismatch as e:
+        LOG.error("%s", e)
+        return "corrupt"
+    rec["md5"] = hasher.hexdigest()
+    return "success"
+
+def bulk_download(hits, save_dir, manifest_path, workers=None):
+    """Download GDC file hits (any iterable) concurrently; returns the manifest rows."""
+    workers = workers or int(env("GDC_WORKERS", 8))
+    save_dir = Path(save_dir)
+    save_dir.mkdir(parents=True, exist_ok=True)
+    manifest = Manifest(manifest_path)
+    todo = []
+    n_hits = 0
+    for hit in hits:
+        n_hits += 1
+        rec = record_from_hit(hit, save_dir)
+        prev = manifest.get(rec["file_id"])
+        if prev and prev["status"] == "success" and is_complete(prev):
+            continue  # finished in an earlier run
+        if is_complete(rec) and rec["size"] and adopt_existing(rec):
+            rec["status"] = "success"
+            manifest.set(rec)
+            continue
+        manifest.set(rec)
+        todo.append(rec)
+    manifest.compact()
+    # files with the same md5 form one group: its first file is downloaded, the others
+    # are then linked from the store by download_file (or fetched if the first failed)
+    groups = {}
+    for rec in todo:
+        groups.setdefault(rec["md5"] or rec["file_id"], []).append(rec)
+    LOG.info("GDC bulk: %d files, %d to fetch (%d distinct) with %d workers",
+             n_hits, len(todo), len(groups), workers)
+
+    def fetch_group(group):
+        for rec in group:
+            try:
+                rec["status"] = download_file(rec)
+            except Exception as e:
+                LOG.exception("%s: download failed: %s", rec["file_name"], e)
+                rec["status"] = "failed"
+        return group
+
+    n = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for fut in as_completed([pool.submit(fetch_group, g) for g in groups.values()]):
+            for rec in fut.result():
+                n += 1
+                manifest.update(rec)
+                LOG.info("[%d/%d] %s %s", n, len(todo), rec["file_name"], rec["status"])
+    manifest.compact()
+    return list(manifest.rows.values())
@@ -0,0 +1,41 @@
+# scripts/download/gdc_client.py
+# Paginated GDC API client. The first page tells us the total; the remaining
+# pages are fetched concurrently with a bounded look-ahead and hits are yielded
+# in order, so callers can stream records to disk without holding the full set.
+import json
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from scripts.utils import LOG, env, http_get_cached
+
+GDC_API = "https://api.gdc.cancer.gov"
+
+def _fetch_page(endpoint, params, offset, size):
+    r = http_get_cached(f"{GDC_API}/{endpoint}", params={**params, "from": offset, "size": size})
+    r.raise_for_status()
+    return r.json()["data"]
+
+def iter_hits(endpoint, filters=None, fields=None, page_size=1000, workers=None, **extra):
+    """Yield every hit of a GDC query on `endpoint` ('cases', 'files', ...)."""
+    workers = workers or int(env("GDC_PAGE_WORKERS", 4))
+    params = {"format": "JSON", **extra}
+    if filters:
+        params["filters"] = json.dumps(filters)
+    if fields:
+        params["fields"] = fields if isinstance(fields, str) else ",".join(fields)
+    first = _fetch_page(endpoint, params, 0, page_size)
+    total = first.get("pagination", {}).get("total", len(first["hits"]))
+    LOG.info("GDC %s: %d hits in pages of %d", endpoint, total, page_size)
+    yield from first["hits"]
+    offsets = iter(range(page_size, total, page_size))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        window = deque()
+        for off in offsets:
+            window.append(pool.submit(_fetch_page, endpoint, params, off, page_size))
+            if len(window) >= workers * 2:
+                break
+        while window:
+            hits = window.popleft().result()["hits"]
+            nxt = next(offsets, None)
+            if nxt is not None:
+                window.append(pool.submit(_fetch_page, endpoint, params, nxt, page_size))
+            yield from hits
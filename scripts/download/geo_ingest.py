@@ -0,0 +1,135 @@
+# scripts/download/geo_ingest.py
+# GEO series ingestion. SOFT files are downloaded on a thread pool (skipped when
+# already in destdir), parsed with GEOparse on a process pool, and cached under
+# GEO_CACHE/<GSE>/<sha256 of the SOFT file>/: the phenotype table as Parquet and
+# the expression values as a float32 .npy matrix written column by column
+# (scripts.etl.expr_matrix). A series whose SOFT file is unchanged is never
+# parsed again: repeat runs only read the cache.
+import hashlib
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from pathlib import Path
+import pandas as pd
+from scripts.utils import LOG, env, http_get, write_table
+from scripts.etl.expr_matrix import ExprMatrix, write_gse_matrix
+
+GEO_FTP = "https://ftp.ncbi.nlm.nih.gov/geo/series"
+PHENOTYPE = "phenotype.parquet"
+EXPRESSION = "expression"  # matrix stem: expression.npy + index sidecars
+
+def cache_root():
+    return Path(env("GEO_CACHE", "data/GEO/parsed"))
+
+def soft_name(gse_id):
+    return f"{gse_id}_family.soft.gz"  # the name GEOparse.get_GEO uses in destdir
+
+def soft_url(gse_id):
+    digits = gse_id[3:]
+    group = f"GSE{digits[:-3]}nnn" if len(digits) > 3 else "GSEnnn"
+    return f"{GEO_FTP}/{group}/{gse_id}/soft/{soft_name(gse_id)}"
+
+def download_soft(gse_id, destdir, chunk_size=1024*1024):
+    dest = Path(destdir) / soft_name(gse_id)
+    if dest.exists():
+        return dest
+    part = dest.with_name(dest.name + ".part")
+    with http_get(soft_url(gse_id), stream=True) as r:
+        r.raise_for_status()
+        with open(part, "wb") as fh:
+            for chunk in r.iter_content(chunk_size):
+                fh.write(chunk)
+    os.replace(part, dest)
+    LOG.info("Downloaded %s", dest)
+    return dest
+
+def soft_digest(path):
+    """sha256 of a SOFT file, remembered in a sidecar keyed on size and mtime."""
+    path = Path(path)
+    st = path.stat()
+    stamp = f"{st.st_size}:{st.st_mtime_ns}"
+    memo = path.with_name(path.name + ".sha256")
+    if memo.exists():
+        saved_stamp, _, digest = memo.read_text().strip().partition(" ")
+        if saved_stamp == stamp:
+            return digest
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(1024 * 1024), b""):
+            h.update(chunk)
+    memo.write_text(f"{stamp} {h.hexdigest()}\n")
+    return h.hexdigest()
+
+def cache_dir(gse_id, digest):
+    return cache_root() / gse_id / digest[:16]
+
+def is_cached(d):
+    # the cache dir is moved into place complete; expression is absent for series without values
+    return (Path(d) / PHENOTYPE).exists()
+
+def parse_to_cache(gse_id, soft, out):
+    """Process-pool worker: parse one SOFT file and write its phenotype table and matrix to out."""
+    import GEOparse  # heavy; imported in the worker only
+    out = Path(out)
+    gse = GEOparse.get_GEO(filepath=str(soft), silent=True)
+    tmp = out.with_name(out.name + ".tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+    write_table(gse.phenotype_data.reset_index(names="sample_id"), tmp / PHENOTYPE)
+    try:
+        write_gse_matrix(gse, tmp / EXPRESSION)
+    except ValueError as e:
+        LOG.warning("%s: no expression matrix (%s)", gse_id, e)
+    shutil.rmtree(out, ignore_errors=True)
+    os.replace(tmp, out)
+    return out
+
+def ingest(gse_ids, destdir="data/GEO", workers=None, processes=None):
+    """Download and parse many series; returns {gse_id: cache dir, or None on failure}."""
+    workers = workers or int(env("GEO_WORKERS", 4))
+    processes = processes or int(env("GEO_PROCESSES", os.cpu_count() or 1))
+    Path(destdir).mkdir(parents=True, exist_ok=True)
+
+    def fetch(gse_id):
+        try:
+            return download_soft(gse_id, destdir)
+        except Exception as e:
+            LOG.warning("GEO download %s failed: %s", gse_id, e)
+            return None
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        softs = dict(zip(gse_ids, pool.map(fetch, gse_ids)))
+    result, todo = {}, {}
+    for gse_id, soft in softs.items():
+        if soft is None:
+            result[gse_id] = None
+            continue
+        d = cache_dir(gse_id, soft_digest(soft))
+        if is_cached(d):
+            result[gse_id] = d
+        else:
+            todo[gse_id] = (soft, d)
+    LOG.info("GEO: %d series cached, %d to parse", sum(v is not None for v in result.values()), len(todo))
+    if todo:
+        with ProcessPoolExecutor(max_workers=min(processes, len(todo))) as pool:
+            futures = {g: pool.submit(parse_to_cache, g, soft, d) for g, (soft, d) in todo.items()}
+            for g, fut in futures.items():
+                try:
+                    result[g] = fut.result()
+                    LOG.info("Parsed %s -> %s", g, result[g])
+                except Exception as e:
+                    LOG.warning("GEO parse %s failed: %s", g, e)
+                    result[g] = None
+    return {g: result[g] for g in gse_ids}
+
+def read_phenotype(d):
+    """gse.phenotype_data as cached (indexed by GSM id again)."""
+    return pd.read_parquet(Path(d) / PHENOTYPE).set_index("sample_id").rename_axis(None)
+
+def expression_stem(d):
+    return Path(d) / EXPRESSION
+
+def read_expression(d):
+    """Memory-mapped ExprMatrix of a cached series, or None if it has no expression values."""
+    stem = expression_stem(d)
+    return ExprMatrix(stem) if ExprMatrix.exists(stem) else None
@@ -0,0 +1,162 @@
+# scripts/download/pride_client.py
+# PRIDE Archive crawler. Project pages and per-project file listings are fetched
+# on a thread pool with a bounded look-ahead, all requests going through one
+# rate limiter (PRIDE_RATE req/s); listings also go through the metadata cache.
+# File sizes come from the listing (or a HEAD when the listing has none), so
+# oversized files are skipped before any body is requested.
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from scripts.utils import LOG, env, http_get, http_get_cached, http_head, RateLimiter
+
+PRIDE_API = "https://www.ebi.ac.uk/pride/ws/archive/v2"
+
+_limiter = None
+
+def limiter():
+    global _limiter
+    if _limiter is None:
+        _limiter = RateLimiter(float(env("PRIDE_RATE", 5)))
+    return _limiter
+
+def _get(url, **kwargs):
+    limiter().wait()
+    return http_get(url, **kwargs)
+
+def _fetch_page(path, params, page):
+    r = http_get_cached(f"{PRIDE_API}/{path}", params={**params, "page": page}, limiter=limiter())
+    r.raise_for_status()
+    return r.json()
+
+def _iter_pages(path, params, items, workers, max_pages=None):
+    """Yield items(page) for every page of a listing; pages after the first are prefetched
+    concurrently in a bounded window."""
+    first = _fetch_page(path, params, 0)
+    yield from items(first)
+    total_pages = first.get("page", {}).get("totalPages") if isinstance(first, dict) else 1
+    if total_pages is None:
+        # no page count in the response: follow `next` links one by one
+        page, data = 0, first
+        while data.get("_links", {}).get("next") and (max_pages is None or page + 1 < max_pages):
+            page += 1
+            data = _fetch_page(path, params, page)
+            yield from items(data)
+        return
+    if max_pages is not None:
+        total_pages = min(total_pages, max_pages)
+    if total_pages > 1:
+        LOG.info("PRIDE %s: %d pages of %s", path, total_pages, params.get("pageSize"))
+    pages = iter(range(1, total_pages))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        window = deque(pool.submit(_fetch_page, path, params, p) for _, p in zip(range(workers * 2), pages))
+        while window:
+            data = window.popleft().result()
+            nxt = next(pages, None)
+            if nxt is not None:
+                window.append(pool.submit(_fetch_page, path, params, nxt))
+            yield from items(data)
+
+def _projects(data):
+    return data.get("_embedded", {}).get("projects", [])
+
+def _files(data):
+    if isinstance(data, list):
+        return data
+    return data.get("_embedded", {}).get("files") or data.get("list", [])
+
+def iter_projects(query, page_size=100, workers=None, max_pages=None, **filters):
+    """Yield project records matching `query`; pages after the first are prefetched concurrently."""
+    workers = workers or int(env("PRIDE_WORKERS", 4))
+    params = {"pageSize": page_size, "q": query, **filters}
+    yield from _iter_pages("projects", params, _projects, workers, max_pages)
+
+def project_files(accession, page_size=1000, workers=None):
+    """All file records of one project (fileName, fileSizeBytes, publicFileLocations, ...)."""
+    workers = workers or int(env("PRIDE_WORKERS", 4))
+    return list(_iter_pages(f"projects/{accession}/files", {"pageSize": page_size}, _files, workers))
+
+def iter_project_files(accessions, workers=None):
+    """Yield (accession, files) in input order; listings are fetched concurrently."""
+    workers = workers or int(env("PRIDE_WORKERS", 4))
+
+    def one(acc):
+        try:
+            return project_files(acc)
+        except Exception as e:
+            LOG.warning("PRIDE file list for %s failed: %s", acc, e)
+            return []
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        yield from zip(accessions, pool.map(one, accessions))
+
+def file_url(entry):
+    """HTTPS link of a listed file (PRIDE's FTP area is also served over HTTPS)."""
+    for loc in entry.get("publicFileLocations") or []:
+        value = loc.get("value", "")
+        if value.startswith("ftp://"):
+            return "https://" + value[len("ftp://"):]
+        if value.startswith("http"):
+            return value
+    link = entry.get("ftpDownloadLink") or entry.get("downloadLink")
+    if link and link.startswith("ftp://"):
+        link = "https://" + link[len("ftp://"):]
+    return link
+
+def file_size(entry, url=None):
+    """Size in bytes from the listing, else from a HEAD request; None when unknown."""
+    for key in ("fileSizeBytes", "fileSize"):
+        if entry.get(key) not in (None, ""):
+            return int(entry[key])
+    if url:
+        limiter().wait()
+        r = http_head(url, allow_redirects=True)
+        if r.status_code == 200 and r.headers.get("Content-Length"):
+            return int(r.headers["Content-Length"])
+    return None
+
+def download(url, dest, chunk_size=1024*1024):
+    """Stream url to dest via a .part file; returns dest or None."""
+    dest = Path(dest)
+    part = dest.with_name(dest.name + ".part")
+    with _get(url, stream=True) as r:
+        if r.status_code != 200:
+            LOG.warning("PRIDE file %s unreachable (status=%s)", url, r.status_code)
+            return None
+        with open(part, "wb") as fh:
+            for chunk in r.iter_content(chunk_size):
+                fh.write(chunk)
+    os.replace(part, dest)
+    return dest
+
+def fetch_project_files(accessions, outdir, suffixes=(".txt", ".csv", ".tsv", ".mzid", ".mzml", ".gz"),
+                        max_bytes=200*1024*1024, workers=None):
+    """Download the small text-like files of each project as outdir/<acc>__<name>; returns the paths."""
+    workers = workers or int(env("PRIDE_WORKERS", 4))
+    outdir = Path(outdir)
+    outdir.mkdir(parents=True, exist_ok=True)
+    jobs = []
+    for acc, files in iter_project_files(list(accessions), workers):
+        for fi in files:
+            url = file_url(fi)
+            name = fi.get("fileName") or (url.rsplit("/", 1)[-1] if url else None)
+            if url and name and name.lower().endswith(suffixes):
+                jobs.append((fi, url, outdir / f"{acc}__{name}"))
+    LOG.info("PRIDE: %d candidate files in %d projects", len(jobs), len(accessions))
+
+    def one(job):
+        fi, url, dest = job
+        try:
+            size = file_size(fi, url)
+            if size is not None and size > max_bytes:
+                LOG.info("Skipping large file %s (size=%s)", dest.name, size)
+                return None
+            if dest.exists() and size is not None and dest.stat().st_size == size:
+                return dest
+            return download(url, dest)
+        except Exception as e:
+            LOG.warning("Failed download %s: %s", url, e)
+            return None
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return [p for p in pool.map(one, jobs) if p is not None]
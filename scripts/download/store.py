@@ -0,0 +1,62 @@
+# scripts/download/store.py
+# Content-addressed local store: objects live at <OBJECT_STORE>/<md5[:2]>/<md5> and are
+# hard-linked (or copied) to wherever a script asked for them, so a file shared by
+# several projects/scripts is downloaded and stored once. The default root is
+# <repo>/data/store whatever the working directory, so scripts run from test/
+# share it with scripts/; OBJECT_STORE overrides it.
+import hashlib
+import os
+import shutil
+from pathlib import Path
+from scripts.utils import LOG, env
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+
+def root():
+    return Path(env("OBJECT_STORE", REPO_ROOT / "data" / "store"))
+
+class ChecksumMismatch(Exception):
+    pass
+
+def object_path(md5):
+    return root() / md5[:2] / md5
+
+def has(md5):
+    return bool(md5) and object_path(md5).exists()
+
+def hash_prefix(path, chunk_size=1024*1024):
+    """md5 state over an already-downloaded prefix, so a resumed stream can continue it."""
+    h = hashlib.md5()
+    if Path(path).exists():
+        with open(path, "rb") as fh:
+            for chunk in iter(lambda: fh.read(chunk_size), b""):
+                h.update(chunk)
+    return h
+
+def materialize(md5, dest):
+    """Expose a stored object at dest (hard link when possible)."""
+    src, dest = object_path(md5), Path(dest)
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    if dest.exists():
+        if os.path.samefile(src, dest):
+            return dest
+        dest.unlink()
+    try:
+        os.link(src, dest)
+    except OSError:
+        shutil.copy2(src, dest)  # different filesystem
+    return dest
+
+def commit(part, digest, dest, expected_md5=None):
+    """Verify a finished download and move it into the store; links it at dest."""
+    if expected_md5 and digest != expected_md5:
+        Path(part).unlink(missing_ok=True)
+        raise ChecksumMismatch(f"{dest}: md5 {digest} != expected {expected_md5}")
+    obj = object_path(digest)
+    obj.parent.mkdir(parents=True, exist_ok=True)
+    if obj.exists():
+        Path(part).unlink()  # same content arrived twice; keep the stored copy
+    else:
+        os.replace(part, obj)
+    LOG.debug("Stored %s as %s", dest, obj)
+    return materialize(digest, dest)
@@ -0,0 +1,39 @@
+# scripts/etl/clean.py
+# Missing-value cleaning shared by the ETL and the test/ processing scripts.
+# Numeric columns are filled with their medians (one median() over the whole
+# numeric block, one fillna), text columns with a marker string; dtypes stay
+# numeric / nullable, and low-cardinality text becomes `category`.
+import pandas as pd
+
+def clean_df(df, fill_text="Unknown", max_categories=1000, category_ratio=0.5):
+    """Return a cleaned copy of df.
+
+    Text columns with at most `max_categories` distinct values (and no more than
+    `category_ratio` of the row count) are stored as category, the rest as string.
+    """
+    df = df.copy()
+    num = df.select_dtypes(include="number").columns
+    if len(num):
+        med = df[num].median()
+        ints = [c for c in num if pd.api.types.is_integer_dtype(df[c])]
+        med[ints] = med[ints].round()  # keep Int64 columns integral
+        df = df.fillna(med.dropna().to_dict())
+    text = df.select_dtypes(include=["object", "string", "category"]).columns
+    if len(text):
+        counts = df[text].nunique()
+        limit = min(max_categories, category_ratio * len(df))
+        cols = {}
+        for c in text:
+            if counts[c] <= limit:
+                # fill on the codes, not on the strings
+                col = df[c] if isinstance(df[c].dtype, pd.CategoricalDtype) else pd.Categorical(df[c])
+                col = pd.Series(col, index=df.index)
+                if col.isna().any():
+                    if fill_text not in col.cat.categories:
+                        col = col.cat.add_categories([fill_text])
+                    col = col.fillna(fill_text)
+                cols[c] = col
+            else:
+                cols[c] = df[c].astype("string").fillna(fill_text)
+        df = df.assign(**cols)
+    return df
@@ -0,0 +1,182 @@
+# scripts/etl/cohort.py
+# Per-cohort statistics processing: robust scaling from streamed KLL sketches,
+# z-score and |z|>2 flags, written to one results/<cohort>_processed.parquet.
+# Optionally fans the per-file passes out over a process pool.
+from concurrent.futures import Executor
+from pathlib import Path
+from typing import List
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+from scripts.utils import LOG, ParquetAppender
+from scripts.etl.quantiles import FrameSketch
+from scripts.etl.sources import iter_chunks, table_columns
+
+RESULTS = Path("results")
+ID_COLUMNS = ("patient_id", "sample_id", "case_id", "seqn")
+TABLE_SUFFIXES = (".parquet", ".arrow", ".feather", ".csv")
+
+def transform_chunk(chunk: pd.DataFrame, id_cols: List[str], numeric_cols: List[str],
+                    medians: np.ndarray, iqrs: np.ndarray, z_thresh: float = 2.0) -> pd.DataFrame:
+    """
+    Median-fill, robust-scale, z-score and flag |z|>z_thresh for all numeric columns at once
+    on one contiguous float block; returns ids + (c, c_z, c_sig) columns built in one go.
+    """
+    block = chunk.reindex(columns=numeric_cols).to_numpy(dtype=np.float64, na_value=np.nan)
+    block = np.where(np.isnan(block), medians, block)
+    scaled = (block - medians) / iqrs
+    with np.errstate(invalid="ignore", divide="ignore"):
+        z = (scaled - scaled.mean(axis=0)) / scaled.std(axis=0)  # ddof=0, as stats.zscore
+    sig = np.abs(z) > z_thresh
+    cols = {}
+    for j, c in enumerate(numeric_cols):
+        cols[c] = scaled[:, j]
+        cols[f"{c}_z"] = z[:, j]
+        cols[f"{c}_sig"] = sig[:, j]
+    # ids as strings: the same column may parse as int in one file, str in another
+    ids = chunk.reindex(columns=id_cols).astype("string").reset_index(drop=True)
+    return pd.concat([ids, pd.DataFrame(cols)], axis=1)
+
+# -------------------------
+# Simple ETL/statistics processing function
+#    - Input: directory with Parquet/Arrow tables (as the downloaders write them) or CSV files
+#    - Output: processed parquet with scaled numeric cols, zscore, binary_signif
+# -------------------------
+def table_files(cohort_dir: Path) -> List[Path]:
+    """One file per table stem in cohort_dir, the typed Parquet/Arrow copy preferred over CSV."""
+    rank = {s: i for i, s in enumerate(TABLE_SUFFIXES)}
+    best = {}
+    for f in cohort_dir.iterdir():
+        r = rank.get(f.suffix.lower())
+        if r is not None and (f.stem not in best or r < rank[best[f.stem].suffix.lower()]):
+            best[f.stem] = f
+    return sorted(best.values())
+
+def is_id_column(c) -> bool:
+    """Known key names or a trailing `_id`; features such as RIDAGEYR or IDH1 are not ids."""
+    c = str(c).lower()
+    return c in ID_COLUMNS or c.endswith("_id")
+
+# Per-file workers (top-level so a process pool can pickle them)
+def _sample_file(f: Path):
+    """Read a small sample to infer dtypes; returns (numeric cols, id cols) or None."""
+    try:
+        df_sample = next(iter_chunks(f, 1000), pd.DataFrame())
+    except Exception as e:
+        LOG.warning("Skipping sample read for %s: %s", f, e)
+        return None
+    numeric = [c for c in df_sample.columns if pd.api.types.is_numeric_dtype(df_sample[c])]
+    ids = [c for c in df_sample.columns if is_id_column(c)]
+    return numeric, ids
+
+def _sketch_file(f: Path, numeric_cols: List[str]):
+    LOG.info("Sketching stats from %s", f)
+    file_sketch = FrameSketch(numeric_cols)
+    try:
+        present = [c for c in table_columns(f) if c in numeric_cols]
+        for chunk in iter_chunks(f, 50000, columns=present):
+            file_sketch.update(chunk)
+    except Exception as e:
+        LOG.warning("Stat sketching failed for %s: %s", f, e)
+        return None
+    return file_sketch
+
+def _transform_file(f: Path, sink, id_cols, numeric_cols, med_vec, iqr_vec, chunk_rows):
+    LOG.info("Transforming file %s", f)
+    try:
+        for chunk in iter_chunks(f, chunk_rows):
+            sink.append(transform_chunk(chunk, id_cols, numeric_cols, med_vec, iqr_vec))
+    except Exception as e:
+        LOG.exception("Processing chunk failed for %s: %s", f, e)
+
+def _transform_file_to_part(f: Path, part_path: Path, *args):
+    with ParquetAppender(part_path) as part:
+        _transform_file(f, part, *args)
+    return part_path if part.rows else None
+
+def process_cohort_dir(cohort_name: str, cohort_dir: Path, out_dir: Path = RESULTS,
+                       numeric_only: bool = False, chunk_rows: int = 100000,
+                       executor: Executor = None):
+    """
+    Process the tables found in cohort_dir (or the single table cohort_dir names).
+    For simplicity: find all tables in cohort_dir (Parquet/Arrow, else CSV), concat (careful with memory),
+    select numeric columns, apply RobustScaler, compute zscore (per column),
+    create binary_signif column suffix _sig (|z|>2).
+    Save results to results/<cohort_name>_processed.parquet
+    With an executor (process pool), files are sampled, sketched and transformed in
+    parallel; sketches and outputs are merged back in sorted file order.
+    """
+    out_dir.mkdir(parents=True, exist_ok=True)
+    files = table_files(cohort_dir) if cohort_dir.is_dir() else [cohort_dir] if cohort_dir.is_file() else []
+    if not files:
+        LOG.warning("No tables found for cohort %s in %s", cohort_name, cohort_dir)
+        return None
+    LOG.info("Processing cohort %s with %d tables", cohort_name, len(files))
+    pmap = executor.map if executor is not None else map
+    # read in chunks to avoid memory explosion: accumulate numeric summary then transform
+    # Strategy: compute column-wise median and IQR across files by streaming, then scale per file
+    col_medians = {}
+    col_iqr = {}
+
+    # First pass: discover numeric and identifier columns from a small sample of each file
+    numeric_cols, id_cols = set(), []
+    for res in pmap(_sample_file, files):
+        if res is None:
+            continue
+        numeric_cols.update(res[0])
+        id_cols += [c for c in res[1] if c not in id_cols]
+
+    # identifier columns (numeric ones too, e.g. SEQN) pass through unscaled
+    numeric_cols = sorted(c for c in numeric_cols if c not in id_cols)
+    if not numeric_cols:
+        LOG.warning("No numeric columns found for %s. Skipping.", cohort_name)
+        return None
+    LOG.info("Identified numeric columns: %s", numeric_cols[:10])
+
+    # Compute robust stats (median, IQR) over every row of every file in one streaming pass:
+    # per-file KLL sketches (bounded memory) merged in file order
+    cohort_sketch = FrameSketch(numeric_cols)
+    for file_sketch in pmap(_sketch_file, files, [numeric_cols] * len(files)):
+        if file_sketch is not None:
+            cohort_sketch.merge(file_sketch)
+
+    qs = cohort_sketch.quantiles([0.25, 0.5, 0.75])
+    for c in numeric_cols:
+        q1, med, q3 = (0.0 if np.isnan(v) else v for v in qs.loc[c])
+        iqr = q3 - q1 if (q3 - q1) != 0 else 1.0
+        col_medians[c] = med
+        col_iqr[c] = iqr
+
+    LOG.info("Computed medians and IQRs for %d cols", len(col_medians))
+
+    med_vec = np.array([col_medians[c] for c in numeric_cols])
+    iqr_vec = np.array([col_iqr[c] for c in numeric_cols])
+    args = (id_cols, numeric_cols, med_vec, iqr_vec, chunk_rows)
+
+    # Second pass: transform per-file and stream row groups into one output parquet
+    out_path = out_dir / f"{cohort_name}_processed.parquet"
+    with ParquetAppender(out_path) as sink:
+        if executor is None:
+            for f in files:
+                _transform_file(f, sink, *args)
+        else:
+            # each worker writes its own part; parts are appended in file order, then removed
+            part_dir = out_dir / f".{cohort_name}_parts"
+            part_dir.mkdir(exist_ok=True)
+            parts = [part_dir / f"{i:05d}.parquet" for i in range(len(files))]
+            futures = [executor.submit(_transform_file_to_part, f, pp, *args)
+                       for f, pp in zip(files, parts)]
+            for fut in futures:
+                part = fut.result()
+                if part is None:
+                    continue
+                for batch in pq.ParquetFile(part).iter_batches():
+                    sink.append(batch.to_pandas())
+                part.unlink()
+            part_dir.rmdir()
+
+    if sink.rows:
+        LOG.info("Saved processed cohort parquet: %s (rows=%d cols=%d)", out_path, sink.rows, len(sink.schema))
+    else:
+        LOG.warning("No processed data chunks produced for %s", cohort_name)
+    return out_path
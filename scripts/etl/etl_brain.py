@@ -2,89 +2,159 @@
 import pandas as pd
 import numpy as np
 from pathlib import Path
-from sklearn.preprocessing import RobustScaler
-from scripts.utils import LOG, ensure_dirs
+from scripts.utils import LOG, ensure_dirs, setup
+from scripts.etl.expr_matrix import ExprMatrix
+from scripts.etl.sources import read_if_exists, LazyTable
+from scripts.etl.join import JoinSource, hash_join
+from scripts.etl import nhanes
+from scripts.etl.scalers import files_digest, get_or_fit
 
-ensure_dirs()
 OUT = Path("results")
-OUT.mkdir(parents=True, exist_ok=True)
+JOINED = OUT / "brain_cancer_joined"  # per-partition join output
+SCALED = OUT / "brain_cancer_scaled"  # per-partition scaled output
+FINAL = OUT / "brain_cancer_etl.csv"
 
-def read_if_exists(path):
-    p = Path(path)
-    if p.exists():
-        try:
-            if p.suffix.lower() in [".csv",".txt"]:
-                return pd.read_csv(p)
-            elif p.suffix.lower() in [".json"]:
-                return pd.read_json(p)
-            else:
-                # try reading with pandas generic
-                return pd.read_csv(p)
-        except Exception as e:
-            LOG.warning("Read failed for %s: %s", p, e)
-            return pd.DataFrame()
-    else:
-        LOG.info("File not found: %s", p)
-        return pd.DataFrame()
-
-# 1. TCGA
-tcga_clinical = read_if_exists("data/TCGA/clinical_gbm_lgg.csv")
-tcga_genomic  = read_if_exists("data/TCGA/genomic_gbm_lgg.csv")
-if not tcga_genomic.empty:
-    tcga_df = tcga_clinical.merge(tcga_genomic, on="patient_id", how="inner")
-else:
-    tcga_df = tcga_clinical
-
-# 2. GEO
-geo_expr = read_if_exists("data/GEO/GSE_expr.csv")  # adjust path/name
-if not geo_expr.empty:
-    merged = tcga_df.merge(geo_expr, on="patient_id", how="left")
-else:
-    merged = tcga_df
-
-# 3. CPTAC / PRIDE proteomics
-cptac_df = read_if_exists("data/CPTAC/brain_proteomics.csv")
-pride_meta = read_if_exists("data/EXTERNAL/pride/pride_projects_meta.csv")
-# if proteomics measurements exist, join a few proteins (names may vary)
+# 2. GEO (memory-mapped probes x samples matrix; only the genes used are read)
+GEO_MATRIX = "data/GEO/GSE4290_expr"  # adjust series as needed
+GEO_GENES = ["TP53","VEGFA","IL6"]
+
+# 3. CPTAC / PRIDE proteomics: join a few proteins (names may vary)
 proteins = ["P53","TP53","VEGFA","IL6"]
-if not cptac_df.empty:
-    # attempt to map protein columns
-    prot_cols = [c for c in cptac_df.columns if any(p.lower() in c.lower() for p in proteins)]
-    prot_cols = prot_cols[:10]
-    prot_select = ["patient_id"] + prot_cols if prot_cols else ["patient_id"]
-    cptac_small = cptac_df.loc[:, [c for c in prot_select if c in cptac_df.columns]]
-    cptac_small = cptac_small.rename(columns={c:c.replace("TP53","prot_P53").replace("P53","prot_P53") for c in prot_select})
-    merged = merged.merge(cptac_small, on="patient_id", how="left")
-
-# 4. TCIA features
-tcia_df = read_if_exists("data/TCIA/TCGA-GBM_series.csv")
-if not tcia_df.empty:
-    # make sure feature names are consistent
-    # assume columns tumor_ratio, necrosis_ratio, inflammation exist
-    merged = merged.merge(tcia_df, on="patient_id", how="left")
-
-# 5. NHANES / blood
-nhanes = read_if_exists("data/EXTERNAL/nhanes/DEMO_J.XPT")  # if XPT converted to csv earlier
-# if using XPT, convert via pyreadstat; here assume CSV exists
-if not nhanes.empty:
-    merged = merged.merge(nhanes, on="patient_id", how="left")
-
-# 6. Numeric normalization
-numeric_cols = [c for c in merged.columns if merged[c].dtype.kind in 'fi']
+
+# 5. NHANES: typed Parquet merged on SEQN by scripts.etl.nhanes; CBC codes renamed to `keep` names
+NHANES = nhanes.MERGED
+NHANES_COLUMNS = {"SEQN": "patient_id", "LBXWBCSI": "WBC", "LBXRBCSI": "RBC", "LBXHGB": "hemoglobin"}
+
 # Filter to important numeric features if too many
 keep = ["age","prot_P53","VEGFA","IL6","tumor_ratio","necrosis_ratio","inflammation","WBC","RBC","hemoglobin"]
-numeric_cols = [c for c in keep if c in merged.columns]
-
-if numeric_cols:
-    LOG.info("Numeric cols for scaling: %s", numeric_cols)
-    scaler = RobustScaler()
-    merged[numeric_cols] = merged[numeric_cols].fillna(0)  # temporary fill before scaling
-    merged[numeric_cols] = scaler.fit_transform(merged[numeric_cols])
-    # now reintroduce NaN where appropriate (but we filled above). Optionally do median-impute:
-    for c in numeric_cols:
-        if merged[c].isna().sum()>0:
-            merged[c].fillna(merged[c].median(), inplace=True)
-
-# 7. Final save
-merged.to_csv(OUT/"brain_cancer_etl.csv", index=False)
-LOG.info("ETL saved to %s", OUT/"brain_cancer_etl.csv")
+
+def geo_expression():
+    if ExprMatrix.exists(GEO_MATRIX):
+        try:
+            return ExprMatrix(GEO_MATRIX).gene_table(GEO_GENES)
+        except Exception as e:
+            LOG.warning("GEO matrix read failed for %s: %s", GEO_MATRIX, e)
+            return pd.DataFrame()
+    return read_if_exists("data/GEO/GSE_expr.csv")  # legacy dense export
+
+def is_protein_col(c):
+    return any(p.lower() in c.lower() for p in proteins)
+
+def rename_proteins(cptac_small):
+    return cptac_small.rename(columns={c:c.replace("TP53","prot_P53").replace("P53","prot_P53") for c in cptac_small.columns})
+
+def prepare_nhanes(df):
+    return df.rename(columns=NHANES_COLUMNS)
+
+def needs(path, cols=(), where=None):
+    """LazyTable for path that reads only patient_id, `cols` and columns matching `where`."""
+    t = LazyTable(path)
+    if t.exists():
+        try:
+            t.require(["patient_id", *cols])
+            if where is not None:
+                # attempt to map columns by name; at most 10 (e.g. protein columns)
+                t.require([c for c in t.columns() if where(c)][:10])
+        except Exception as e:
+            LOG.warning("Header read failed for %s: %s", t.path, e)
+    return t
+
+def join_sources():
+    """Join plan: TCGA clinical is the base; each source is hash-partitioned on patient_id.
+
+    The base is read whole; every other source only for the columns a later step
+    uses (the scaling `keep` list, or the protein columns for CPTAC).
+    """
+    base = JoinSource("tcga_clinical", "data/TCGA/clinical_gbm_lgg.csv")
+    sources = [
+        # 1. TCGA genomic
+        JoinSource("tcga_genomic", needs("data/TCGA/genomic_gbm_lgg.csv", keep), how="inner"),
+        # 2. GEO
+        JoinSource("geo", frame=geo_expression()),
+        # 3. CPTAC proteomics
+        JoinSource("cptac", needs("data/CPTAC/brain_proteomics.csv", where=is_protein_col), prepare=rename_proteins),
+        # 4. TCIA features (assume columns tumor_ratio, necrosis_ratio, inflammation exist)
+        JoinSource("tcia", needs("data/TCIA/TCGA-GBM_series.csv", keep)),
+        # 5. NHANES / blood
+        JoinSource("nhanes", needs(NHANES, list(NHANES_COLUMNS)), prepare=prepare_nhanes),
+    ]
+    return hash_join(base, sources, JOINED)
+
+def joined_parts():
+    return sorted(JOINED.glob("part-*.parquet"))
+
+def scaled_parts():
+    return sorted(SCALED.glob("part-*.parquet"))
+
+def _numeric_block(part, cols):
+    return part[cols].apply(pd.to_numeric, errors="coerce").fillna(0)  # temporary fill before scaling
+
+def fit_and_scale(parts, out_dir=SCALED):
+    """Scale the kept numeric columns partition by partition with the stored (or newly fitted) scaler."""
+    out_dir.mkdir(parents=True, exist_ok=True)
+    for old in out_dir.glob("part-*.parquet"):
+        old.unlink()
+    if not parts:
+        LOG.warning("Nothing joined; nothing to scale")
+        return []
+    columns = pd.read_parquet(parts[0]).columns.tolist()
+    numeric_cols = [c for c in keep if c in columns]
+    scaler = None
+    if numeric_cols:
+        LOG.info("Numeric cols for scaling: %s", numeric_cols)
+        # kept next to the scaled partitions (part of the stage output) and refitted whenever
+        # the joined data changes (streaming, one partition at a time); SCALER_REFIT=1 refits
+        scaler = get_or_fit("brain_etl", numeric_cols,
+                            lambda: (_numeric_block(pd.read_parquet(p, columns=numeric_cols), numeric_cols)
+                                     for p in parts),
+                            data_key=files_digest(parts), path=out_dir / "scaler.json")
+    out = []
+    for p in parts:
+        part = pd.read_parquet(p).reindex(columns=columns)
+        if scaler is not None:
+            part[numeric_cols] = scaler.transform(_numeric_block(part, numeric_cols))
+        part.to_parquet(out_dir / p.name, index=False)
+        out.append(out_dir / p.name)
+    return out
+
+def save(parts, out_path=FINAL):
+    """Concatenate partitions into the final CSV, one partition in memory at a time."""
+    if not parts:
+        pd.DataFrame().to_csv(out_path, index=False)
+        LOG.warning("Nothing to save; wrote empty %s", out_path)
+        return out_path
+    columns = pd.read_parquet(parts[0]).columns.tolist()
+    for i, p in enumerate(parts):
+        part = pd.read_parquet(p).reindex(columns=columns)
+        part.to_csv(out_path, mode="w" if i == 0 else "a", header=(i == 0), index=False)
+    LOG.info("ETL saved to %s", out_path)
+    return out_path
+
+# Stage entry points (see scripts/pipeline.py)
+def run_nhanes():
+    nhanes.main()
+
+def run_join():
+    join_sources()
+
+def run_scale():
+    fit_and_scale(joined_parts())
+
+def run_save():
+    save(scaled_parts())
+
+def main():
+    ensure_dirs()
+    OUT.mkdir(parents=True, exist_ok=True)
+    # 5a. NHANES .XPT -> Parquet (no-op when already converted)
+    run_nhanes()
+    # 1-5. Join all sources out of core
+    run_join()
+    # 6. Numeric normalization
+    run_scale()
+    # 7. Final save
+    run_save()
+
+if __name__ == "__main__":
+    setup()
+    main()
@@ -0,0 +1,111 @@
+# scripts/etl/expr_matrix.py
+# On-disk expression matrix: probes x samples float32 .npy (memory-mapped on read)
+# with plain-text sidecars for the row (probe) and column (sample) index, and an
+# optional probe -> gene symbol sidecar. Replaces the dense pivot_samples() frame.
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from scripts.utils import LOG
+
+def _sidecar(stem, name):
+    return Path(f"{stem}.{name}.txt")
+
+def _write_index(path, values):
+    path.write_text("\n".join(str(v) for v in values) + "\n", encoding="utf-8")
+
+def _read_index(path):
+    return path.read_text(encoding="utf-8").splitlines()
+
+def matrix_files(stem):
+    """The files making up a matrix: <stem>.npy and its sidecars (those present)."""
+    stem = Path(stem)
+    files = [Path(f"{stem}.npy")] + [_sidecar(stem, n) for n in ("probes", "samples", "genes")]
+    return [f for f in files if f.exists()]
+
+def write_gse_matrix(gse, stem, value_col="VALUE"):
+    """Write a GEOparse GSE as <stem>.npy (+ sidecars), one sample column at a time."""
+    stem = Path(stem)
+    gsms = [(name, gsm) for name, gsm in gse.gsms.items() if value_col in gsm.table.columns]
+    if not gsms:
+        raise ValueError(f"No sample tables with {value_col} in {stem.name}")
+    # probe order from the first sample; later samples may add probes
+    probes = {}
+    for _, gsm in gsms:
+        for p in gsm.table["ID_REF"].astype(str):
+            probes.setdefault(p, len(probes))
+    samples = [name for name, _ in gsms]
+    mm = np.lib.format.open_memmap(f"{stem}.npy", mode="w+", dtype=np.float32,
+                                   shape=(len(probes), len(samples)))
+    mm[:] = np.nan
+    for j, (_, gsm) in enumerate(gsms):
+        rows = gsm.table["ID_REF"].astype(str).map(probes).to_numpy()
+        mm[rows, j] = pd.to_numeric(gsm.table[value_col], errors="coerce").to_numpy(np.float32)
+    mm.flush()
+    del mm
+    _write_index(_sidecar(stem, "probes"), probes)
+    _write_index(_sidecar(stem, "samples"), samples)
+    genes = _probe_genes(gse, probes)
+    if genes is not None:
+        _write_index(_sidecar(stem, "genes"), genes)
+    LOG.info("Saved expression matrix %s.npy (%d probes x %d samples)", stem, len(probes), len(samples))
+    return stem
+
+def _probe_genes(gse, probes):
+    for gpl in gse.gpls.values():
+        table = gpl.table
+        col = next((c for c in ("Gene Symbol", "GENE_SYMBOL", "Symbol", "gene_assignment") if c in table.columns), None)
+        if col is None or "ID" not in table.columns:
+            continue
+        sym = dict(zip(table["ID"].astype(str), table[col].astype(str)))
+        # multi-gene probes ("A /// B"): keep the first symbol
+        return [sym.get(p, "").split(" /// ")[0].split(" // ")[0] for p in probes]
+    return None
+
+class ExprMatrix:
+    """Read-only, memory-mapped view of a matrix written by write_gse_matrix."""
+
+    def __init__(self, stem):
+        stem = Path(stem)
+        self.values = np.load(f"{stem}.npy", mmap_mode="r")
+        self.probes = _read_index(_sidecar(stem, "probes"))
+        self.samples = _read_index(_sidecar(stem, "samples"))
+        genes = _sidecar(stem, "genes")
+        self.genes = _read_index(genes) if genes.exists() else None
+        self._probe_pos = {p: i for i, p in enumerate(self.probes)}
+        self._sample_pos = {s: i for i, s in enumerate(self.samples)}
+
+    @staticmethod
+    def exists(stem):
+        return Path(f"{stem}.npy").exists()
+
+    def probe(self, probe_id):
+        """One probe across all samples (a view, no copy)."""
+        return self.values[self._probe_pos[probe_id]]
+
+    def sample(self, sample_id):
+        """One sample across all probes (a strided view, no copy)."""
+        return self.values[:, self._sample_pos[sample_id]]
+
+    def gene_rows(self, genes):
+        if self.genes is None:
+            raise ValueError("matrix has no probe -> gene sidecar")
+        wanted = set(genes)
+        return [i for i, g in enumerate(self.genes) if g in wanted]
+
+    def frame(self, probes=None, samples=None, genes=None):
+        """Materialise only the selected rows/columns as a DataFrame (probes x samples)."""
+        rows = (self.gene_rows(genes) if genes is not None
+                else [self._probe_pos[p] for p in probes] if probes is not None
+                else slice(None))
+        cols = [self._sample_pos[s] for s in samples] if samples is not None else slice(None)
+        block = self.values[rows][:, cols] if not isinstance(rows, slice) else self.values[:, cols]
+        index = [self.probes[i] for i in rows] if not isinstance(rows, slice) else self.probes
+        columns = [self.samples[j] for j in cols] if not isinstance(cols, slice) else self.samples
+        return pd.DataFrame(np.asarray(block), index=index, columns=columns)
+
+    def gene_table(self, genes, prefix="expr_"):
+        """samples x genes table (mean over a gene's probes), ready to join on patient_id."""
+        df = self.frame(genes=genes)
+        df.index = [self.genes[self._probe_pos[p]] for p in df.index]
+        out = df.groupby(level=0).mean().T.add_prefix(prefix)
+        return out.rename_axis("patient_id").reset_index()
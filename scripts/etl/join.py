@@ -0,0 +1,124 @@
+# scripts/etl/join.py
+# Out-of-core multi-source join on one key. Every source is streamed once and
+# hash-partitioned on the key into small Parquet pieces; then, partition by
+# partition, the base rows are merged with the matching rows of each source and
+# the result is written out. Peak memory is one partition of every source,
+# not the full wide table (plus its copies per merge).
+import math
+import shutil
+from pathlib import Path
+import pandas as pd
+from scripts.utils import LOG, env
+from scripts.etl.sources import LazyTable
+
+def partition_bytes():
+    return int(env("ETL_PARTITION_BYTES", 256 * 1024 * 1024))
+
+class JoinSource:
+    """A table to join: a LazyTable/path (streamed in chunks) or a small in-memory frame.
+
+    Only the columns required on the LazyTable are read. `prepare` is applied to
+    every chunk before partitioning (renames etc.); `how` is the pandas merge
+    type used against the running result.
+    """
+
+    def __init__(self, name, table=None, frame=None, how="left", prepare=None):
+        self.name = name
+        self.table = LazyTable(table) if isinstance(table, (str, Path)) else table
+        self.path = self.table.path if self.table is not None else None
+        self.frame = frame
+        self.how = how
+        self.prepare = prepare
+
+    def available(self):
+        if self.frame is not None:
+            return not self.frame.empty
+        if self.path is None or not self.path.exists():
+            LOG.info("File not found: %s", self.path)
+            return False
+        return True
+
+    def size_bytes(self):
+        if self.frame is not None:
+            return int(self.frame.memory_usage(deep=False).sum())
+        return self.path.stat().st_size
+
+    def chunks(self, chunk_rows):
+        src = [self.frame] if self.frame is not None else self.table.chunks(chunk_rows)
+        for chunk in src:
+            yield self.prepare(chunk) if self.prepare else chunk
+
+def partition_of(keys, n_parts):
+    """Stable partition number per key (hash of its string form)."""
+    return pd.util.hash_array(keys.astype(str).to_numpy(dtype=object)) % n_parts
+
+def partition_source(src, root, n_parts, key, chunk_rows):
+    """Write src as root/<name>/p<part>/<chunk>.parquet; returns its dtypes (None if unusable)."""
+    dtypes = None
+    for i, chunk in enumerate(src.chunks(chunk_rows)):
+        if key not in chunk.columns:
+            LOG.warning("Source %s has no %s column; left out of the join", src.name, key)
+            return None
+        chunk = chunk.assign(**{key: chunk[key].astype("string")})
+        if dtypes is None:
+            dtypes = chunk.dtypes
+        for part, piece in chunk.groupby(partition_of(chunk[key], n_parts), sort=False):
+            d = root / src.name / f"p{part:04d}"
+            d.mkdir(parents=True, exist_ok=True)
+            piece.to_parquet(d / f"{i:06d}.parquet", index=False)
+    return dtypes
+
+def read_partition(root, name, part, dtypes):
+    d = root / name / f"p{part:04d}"
+    if not d.exists():
+        # no rows hash here: an empty frame with the source's columns and dtypes
+        return pd.DataFrame({c: pd.Series(dtype=t) for c, t in dtypes.items()})
+    return pd.concat([pd.read_parquet(f) for f in sorted(d.glob("*.parquet"))], ignore_index=True)
+
+def join_plan(base, sources):
+    """Sources that can take part, in order; logged so a run shows what will be joined."""
+    plan = [s for s in sources if s.available()]
+    LOG.info("Join plan: %s <- %s", base.name,
+             ", ".join(f"{s.name} ({s.how})" for s in plan) or "(nothing to join)")
+    return plan
+
+def hash_join(base, sources, out_dir, key="patient_id", n_parts=None, chunk_rows=200000):
+    """Join base with sources partition by partition; returns the written part files."""
+    out_dir = Path(out_dir)
+    if not base.available():
+        LOG.warning("Base table %s missing; nothing to join", base.name)
+        return []
+    plan = join_plan(base, sources)
+    if n_parts is None:
+        total = base.size_bytes() + sum(s.size_bytes() for s in plan)
+        n_parts = max(1, math.ceil(total / partition_bytes()))
+    if out_dir.exists():
+        shutil.rmtree(out_dir)
+    tmp = out_dir / ".partitions"
+    tmp.mkdir(parents=True)
+    LOG.info("Hash-partitioning %d sources into %d partitions on %s", len(plan) + 1, n_parts, key)
+    base_types = partition_source(base, tmp, n_parts, key, chunk_rows)
+    if base_types is None:
+        return []
+    types = {}
+    for s in plan:
+        try:
+            t = partition_source(s, tmp, n_parts, key, chunk_rows)
+        except Exception as e:
+            LOG.warning("Read failed for %s: %s; left out of the join", s.name, e)
+            shutil.rmtree(tmp / s.name, ignore_errors=True)
+            continue
+        if t is not None:
+            types[s.name] = t
+    plan = [s for s in plan if s.name in types]
+    parts = []
+    for part in range(n_parts):
+        left = read_partition(tmp, base.name, part, base_types)
+        for s in plan:
+            left = left.merge(read_partition(tmp, s.name, part, types[s.name]), on=key, how=s.how)
+        out = out_dir / f"part-{part:04d}.parquet"
+        left.to_parquet(out, index=False)
+        parts.append(out)
+    shutil.rmtree(tmp)
+    LOG.info("Joined %d partitions into %s", len(parts), out_dir)
+    return parts
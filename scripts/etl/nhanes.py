@@ -0,0 +1,105 @@
+# scripts/etl/nhanes.py
+# NHANES ingestion. SAS transport (.XPT) files are parsed in chunks and written
+# once per table as typed Parquet (<PARQUET>/<stem>.parquet); a table is only
+# re-converted when its .XPT is newer. The tables of each cycle are then joined
+# on SEQN (index join, DEMO as the base) and the cycles stacked into one file.
+from collections import defaultdict
+from pathlib import Path
+import pandas as pd
+from scripts.utils import LOG, env, setup, write_table, ParquetAppender
+
+RAW = Path("data/EXTERNAL/nhanes")
+PARQUET = Path("data/EXTERNAL/nhanes_parquet")
+MERGED = PARQUET / "nhanes_merged.parquet"
+BASE_TABLE = "DEMO"  # one row per respondent; every other table is joined onto it
+
+def split_stem(stem):
+    """'DEMO_J' -> ('DEMO', '_J'); 'DEMO' (1999-2000) -> ('DEMO', ''); 'P_DEMO' -> ('DEMO', 'P_')."""
+    if stem.startswith("P_"):  # 2017-March 2020 pre-pandemic release
+        return stem[2:], "P_"
+    code, sep, suffix = stem.rpartition("_")
+    if sep and len(suffix) == 1 and suffix.isalpha():
+        return code, "_" + suffix
+    return stem, ""
+
+def _typed(chunk):
+    # XPT has only doubles and byte strings: keep doubles, decode strings, SEQN as an integer key
+    for c in chunk.columns:
+        if chunk[c].dtype == object:
+            chunk[c] = chunk[c].astype("string")
+    if "SEQN" in chunk.columns:
+        chunk["SEQN"] = chunk["SEQN"].astype("Int64")
+    return chunk
+
+def xpt_to_parquet(xpt, out, chunk_rows=None):
+    """Convert one .XPT to Parquet chunk by chunk; skipped when out is newer than xpt."""
+    xpt, out = Path(xpt), Path(out)
+    if out.exists() and out.stat().st_mtime >= xpt.stat().st_mtime:
+        return out
+    chunk_rows = chunk_rows or int(env("NHANES_CHUNK_ROWS", 50000))
+    with ParquetAppender(out) as sink, \
+            pd.read_sas(xpt, format="xport", chunksize=chunk_rows, encoding="latin-1") as reader:
+        for chunk in reader:
+            sink.append(_typed(chunk))
+    LOG.info("Converted %s -> %s (%d rows)", xpt, out, sink.rows)
+    return out
+
+def convert_all(raw=RAW, out_dir=PARQUET):
+    out = []
+    for xpt in sorted(Path(raw).glob("*.[Xx][Pp][Tt]")):
+        try:
+            out.append(xpt_to_parquet(xpt, Path(out_dir) / f"{xpt.stem}.parquet"))
+        except Exception as e:
+            LOG.warning("Could not convert %s: %s", xpt, e)
+    return [p for p in out if p.exists()]
+
+def merge_cycle(tables):
+    """Join one cycle's {code: parquet} on SEQN; None when the cycle has no DEMO table."""
+    frames = {code: pd.read_parquet(p).set_index("SEQN").sort_index() for code, p in tables.items()}
+    base = frames.pop(BASE_TABLE, None)
+    if base is None:
+        LOG.warning("No %s table among %s; cycle left out", BASE_TABLE, sorted(tables))
+        return None
+    seen, others = set(base.columns), []
+    for code, f in frames.items():
+        if not f.index.is_unique:
+            # long tables (several rows per respondent) would multiply DEMO rows
+            LOG.warning("%s has several rows per SEQN; left out of the merge", code)
+            continue
+        f = f.drop(columns=[c for c in f.columns if c in seen])
+        seen.update(f.columns)
+        others.append(f)
+    return base.join(others, how="left") if others else base
+
+def merge_all(parts, out=MERGED):
+    """Merge every cycle found in parts into out; skipped when out is newer than all parts."""
+    parts = [Path(p) for p in parts if Path(p) != Path(out)]
+    if not parts:
+        LOG.warning("No NHANES tables to merge")
+        return None
+    if Path(out).exists() and Path(out).stat().st_mtime >= max(p.stat().st_mtime for p in parts):
+        LOG.info("NHANES merge up to date: %s", out)
+        return Path(out)
+    cycles = defaultdict(dict)
+    for p in parts:
+        code, suffix = split_stem(p.stem)
+        cycles[suffix][code] = p
+    merged = []
+    for suffix, tables in sorted(cycles.items()):
+        df = merge_cycle(tables)
+        if df is not None:
+            merged.append(df.assign(cycle=suffix))
+    if not merged:
+        return None
+    df = pd.concat(merged).reset_index()
+    write_table(df, out, {"SEQN": "Int64", "cycle": "category"})
+    LOG.info("Merged %d NHANES cycles into %s (%d rows)", len(merged), out, len(df))
+    return Path(out)
+
+def main():
+    PARQUET.mkdir(parents=True, exist_ok=True)
+    merge_all(convert_all())
+
+if __name__ == "__main__":
+    setup()
+    main()
@@ -0,0 +1,89 @@
+# scripts/etl/phenotype.py
+# Compact GEO phenotype tables. GEOparse gives one object column per field with
+# the same long protocol text repeated for every sample. Here protocol fields are
+# moved to a side table (each distinct text stored once across all series, the
+# sample rows keep a short key such as "P0003"), the remaining text is
+# dictionary-encoded as category, and series are combined with union_categoricals
+# so the codes stay compact instead of falling back to object.
+from pathlib import Path
+import pandas as pd
+from pandas.api.types import union_categoricals
+from scripts.utils import LOG, write_table
+
+def is_protocol_field(col):
+    c = str(col).lower()
+    return "protocol" in c or c.startswith("data_processing")
+
+def _is_categorical(col):
+    return isinstance(col.dtype, pd.CategoricalDtype)
+
+class PhenotypeStore:
+    """Phenotype rows of many series plus one deduplicated protocol table."""
+
+    def __init__(self):
+        self.frames = []
+        self.protocols = {}  # text -> key
+
+    def _protocol_key(self, text):
+        key = self.protocols.get(text)
+        if key is None:
+            key = self.protocols[text] = f"P{len(self.protocols):04d}"
+        return key
+
+    def add(self, series_id, pheno):
+        """Encode one series' phenotype table and keep it; returns the encoded frame.
+
+        Text columns that are already category (see scripts.etl.clean) stay so.
+        """
+        cols = {}
+        for c in pheno.columns:
+            col = pheno[c]
+            if pd.api.types.is_numeric_dtype(col) or pd.api.types.is_bool_dtype(col):
+                cols[c] = col
+                continue
+            if is_protocol_field(c):
+                col = col if _is_categorical(col) else col.astype("string").astype("category")
+                # map the (few) categories, not the rows
+                col = col.cat.rename_categories([self._protocol_key(str(t)) for t in col.cat.categories])
+            elif not _is_categorical(col):
+                col = col.astype("string")
+                if col.nunique() <= 0.5 * len(col):  # repeated values; ids and titles stay string
+                    col = col.astype("category")
+            cols[c] = col
+        df = pd.DataFrame(cols, index=pheno.index)
+        df.insert(0, "series", pd.Categorical([series_id] * len(df)))
+        self.frames.append(df)
+        LOG.info("Phenotype %s: %d samples, %d protocol texts so far", series_id, len(df), len(self.protocols))
+        return df
+
+    def frame(self):
+        """All series in one frame; text columns stay categorical across series."""
+        if not self.frames:
+            return pd.DataFrame()
+        columns = list(dict.fromkeys(c for f in self.frames for c in f.columns))
+        out = {}
+        for c in columns:
+            parts = [f[c] if c in f.columns else pd.Series(float("nan"), index=f.index) for f in self.frames]
+            present = [p for f, p in zip(self.frames, parts) if c in f.columns]
+            if all(_is_categorical(p) for p in present):
+                parts = [p if _is_categorical(p) else p.astype(present[0].dtype) for p in parts]
+                out[c] = pd.Series(union_categoricals(parts, ignore_order=True))
+            elif any(_is_categorical(p) or isinstance(p.dtype, pd.StringDtype) for p in present):
+                out[c] = pd.concat([p.astype("string") for p in parts], ignore_index=True)
+            else:
+                out[c] = pd.concat(parts, ignore_index=True)
+        return pd.DataFrame(out)
+
+    def protocol_table(self):
+        return pd.DataFrame({"protocol_id": list(self.protocols.values()),
+                             "text": list(self.protocols.keys())}).astype("string")
+
+    def protocol(self, key):
+        return next((t for t, k in self.protocols.items() if k == key), None)
+
+    def save(self, stem):
+        """Write <stem>.parquet (samples) and <stem>_protocols.parquet (side table)."""
+        stem = Path(stem)
+        written = write_table(self.frame(), stem.with_suffix(".parquet"))
+        written += write_table(self.protocol_table(), stem.with_name(stem.name + "_protocols.parquet"))
+        return written
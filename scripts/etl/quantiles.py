@@ -0,0 +1,103 @@
+# scripts/etl/quantiles.py
+# Mergeable streaming quantile sketch (KLL, Karnin-Lang-Liberty) on numpy buffers.
+# Memory is O(k) per column whatever the row count; rank error is roughly 1.7/k.
+# Until a column passes k values nothing is compacted and quantiles are exact,
+# linearly interpolated like np.percentile (and sklearn's RobustScaler).
+# Compaction offsets alternate deterministically, so the same input order always
+# gives the same sketch (no RNG).
+import numpy as np
+import pandas as pd
+
+class KLLSketch:
+    def __init__(self, k=1000, c=2/3):
+        self.k = k
+        self.c = c
+        self.levels = [np.empty(0)]
+        self.n = 0
+        self._flip = 0
+
+    def _capacity(self, h):
+        depth = len(self.levels) - h - 1
+        return max(2, int(np.ceil(self.k * self.c ** depth)))
+
+    def _compact(self, h):
+        if h + 1 == len(self.levels):
+            self.levels.append(np.empty(0))
+        buf = np.sort(self.levels[h])
+        keep = buf[:0]
+        if len(buf) % 2:
+            keep, buf = buf[-1:], buf[:-1]
+        self._flip ^= 1
+        self.levels[h + 1] = np.concatenate([self.levels[h + 1], buf[self._flip::2]])
+        self.levels[h] = keep
+
+    def _compress(self):
+        while True:
+            for h, items in enumerate(self.levels):
+                if len(items) > self._capacity(h):
+                    self._compact(h)
+                    break
+            else:
+                return
+
+    def update(self, values):
+        v = np.asarray(values, dtype=float).ravel()
+        v = v[~np.isnan(v)]
+        if not v.size:
+            return self
+        self.n += v.size
+        self.levels[0] = np.concatenate([self.levels[0], v])
+        self._compress()
+        return self
+
+    def merge(self, other):
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for h, items in enumerate(other.levels):
+            self.levels[h] = np.concatenate([self.levels[h], items])
+        self.n += other.n
+        self._compress()
+        return self
+
+    def quantile(self, q):
+        """Approximate q-quantile(s); NaN when the sketch is empty."""
+        qs = np.atleast_1d(np.asarray(q, dtype=float))
+        if self.n == 0:
+            out = np.full(qs.shape, np.nan)
+        elif len(self.levels) == 1:
+            out = np.percentile(self.levels[0], qs * 100)  # never compacted: every value is here
+        else:
+            items = np.concatenate(self.levels)
+            weights = np.concatenate([np.full(len(l), 2.0 ** h) for h, l in enumerate(self.levels)])
+            order = np.argsort(items, kind="stable")
+            items, cum = items[order], np.cumsum(weights[order])
+            idx = np.searchsorted(cum, qs * cum[-1], side="left")
+            out = items[np.clip(idx, 0, len(items) - 1)]
+        return out if np.ndim(q) else float(out[0])
+
+class FrameSketch:
+    """One KLLSketch per column of a table, updated chunk by chunk."""
+
+    def __init__(self, columns, k=1000):
+        self.columns = list(columns)
+        self.sketches = {c: KLLSketch(k) for c in self.columns}
+
+    def update(self, df):
+        for c in self.columns:
+            if c in df.columns:
+                self.sketches[c].update(pd.to_numeric(df[c], errors="coerce").to_numpy(dtype=float))
+        return self
+
+    def merge(self, other):
+        for c, sk in other.sketches.items():
+            if c in self.sketches:
+                self.sketches[c].merge(sk)
+            else:
+                self.columns.append(c)
+                self.sketches[c] = sk
+        return self
+
+    def quantiles(self, qs):
+        """DataFrame indexed by column with one column per requested quantile."""
+        return pd.DataFrame({c: self.sketches[c].quantile(list(qs)) for c in self.columns},
+                            index=list(qs)).T
@@ -0,0 +1,126 @@
+# scripts/etl/scalers.py
+# Fit-once robust scaling. A scaler (per-column median and IQR; exactly
+# sklearn's RobustScaler statistics up to k values per column, within KLL rank
+# error beyond) is fitted in one streaming pass with KLL sketches and stored as
+# JSON under SCALER_STORE, keyed by cohort and a hash of the feature set. Later
+# runs load it and transform chunk by chunk (or row by row) without refitting;
+# SCALER_REFIT=1 forces a new fit, and so does a changed data_key (e.g.
+# files_digest() of the inputs) when the caller passes one.
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from scripts.utils import LOG, env
+from scripts.etl.quantiles import FrameSketch
+
+def store_dir():
+    return Path(env("SCALER_STORE", "results/scalers"))
+
+def feature_key(features):
+    return hashlib.sha256("\n".join(sorted(map(str, features))).encode()).hexdigest()[:12]
+
+def scaler_path(cohort, features):
+    return store_dir() / f"{cohort}-{feature_key(features)}.json"
+
+class RobustParams:
+    """Fitted centers and scales; (x - center) / scale per feature."""
+
+    def __init__(self, cohort, features, center, scale, n=0, data_key=None):
+        self.cohort = cohort
+        self.features = list(features)
+        self.center = np.asarray(center, dtype=float)
+        self.scale = np.asarray(scale, dtype=float)
+        self.n = n
+        self.data_key = data_key
+
+    def transform(self, df):
+        """Scale the features present in df (a copy); other columns are left as they are."""
+        cols = [c for c in self.features if c in df.columns]
+        if not cols:
+            return df
+        idx = [self.features.index(c) for c in cols]
+        out = df.copy()
+        values = out[cols].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=float)
+        out[cols] = (values - self.center[idx]) / self.scale[idx]
+        return out
+
+    def transform_chunks(self, chunks):
+        for chunk in chunks:
+            yield self.transform(chunk)
+
+    def transform_row(self, row):
+        """Scale one record ({feature: value}); constant time per row."""
+        out = dict(row)
+        for i, c in enumerate(self.features):
+            if c in out and out[c] is not None:
+                out[c] = float((float(out[c]) - self.center[i]) / self.scale[i])
+        return out
+
+    def save(self, path=None):
+        path = Path(path or scaler_path(self.cohort, self.features))
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".json.tmp")
+        tmp.write_text(json.dumps({
+            "cohort": self.cohort, "features": self.features, "n": self.n, "fitted_at": time.time(),
+            "data_key": self.data_key,
+            "center": self.center.tolist(), "scale": self.scale.tolist(),
+        }))
+        os.replace(tmp, path)
+        return path
+
+    @classmethod
+    def load(cls, path):
+        d = json.loads(Path(path).read_text())
+        return cls(d["cohort"], d["features"], d["center"], d["scale"], d.get("n", 0), d.get("data_key"))
+
+def fit_robust(cohort, features, chunks, k=2000):
+    """Median / IQR of each feature over an iterable of DataFrame chunks (NaN ignored).
+
+    Quantiles are exact (interpolated as np.percentile) until a column passes k values,
+    then within KLL rank error.
+    """
+    sketch = FrameSketch(features, k=k)
+    n = 0
+    for chunk in chunks:
+        sketch.update(chunk)
+        n += len(chunk)
+    q = sketch.quantiles([0.25, 0.5, 0.75])
+    center = q[0.5].fillna(0).to_numpy()
+    scale = (q[0.75] - q[0.25]).to_numpy()
+    scale = np.where(np.isfinite(scale) & (scale != 0), scale, 1.0)  # constant column: like RobustScaler
+    return RobustParams(cohort, features, center, scale, n)
+
+def files_digest(paths, chunk_size=1024*1024):
+    """sha256 over the names and contents of files, as a data_key for get_or_fit."""
+    h = hashlib.sha256()
+    for p in sorted(map(Path, paths)):
+        h.update(p.name.encode())
+        with open(p, "rb") as fh:
+            for chunk in iter(lambda: fh.read(chunk_size), b""):
+                h.update(chunk)
+    return h.hexdigest()
+
+def get_or_fit(cohort, features, chunks, refit=None, data_key=None, path=None):
+    """Stored scaler for (cohort, features), fitted from `chunks` (iterable or callable) if absent.
+
+    With a data_key, a stored scaler fitted on other data (another key) is refitted;
+    `path` overrides the location under SCALER_STORE.
+    """
+    features = list(features)
+    path = Path(path) if path else scaler_path(cohort, features)
+    if refit is None:
+        refit = env("SCALER_REFIT", "0") == "1"
+    if path.exists() and not refit:
+        params = RobustParams.load(path)
+        if set(params.features) == set(features) and (data_key is None or params.data_key == data_key):
+            LOG.info("Using stored scaler %s (fitted on %d rows)", path, params.n)
+            return params
+        LOG.info("Stored scaler %s does not match the features/data; refitting", path)
+    params = fit_robust(cohort, features, chunks() if callable(chunks) else chunks)
+    params.data_key = data_key
+    params.save(path)
+    LOG.info("Fitted scaler for %s on %d rows -> %s", cohort, params.n, path)
+    return params
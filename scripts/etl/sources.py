@@ -0,0 +1,108 @@
+# scripts/etl/sources.py
+# Table readers shared by the ETL steps: whole-file reads and chunked iteration.
+from pathlib import Path
+import pandas as pd
+from scripts.utils import LOG
+
+def resolve_table(path):
+    """Prefer the typed Parquet/Arrow output of the downloaders over the CSV of the same stem."""
+    p = Path(path)
+    for alt in (p.with_suffix(".parquet"), p.with_suffix(".arrow"), p.with_suffix(".feather")):
+        if alt != p and alt.exists():
+            return alt
+    return p
+
+def read_if_exists(path):
+    p = resolve_table(path)
+    if p.exists():
+        try:
+            if p.suffix.lower() == ".parquet":
+                return pd.read_parquet(p)
+            elif p.suffix.lower() in [".arrow",".feather"]:
+                return pd.read_feather(p)
+            elif p.suffix.lower() in [".csv",".txt"]:
+                return pd.read_csv(p)
+            elif p.suffix.lower() in [".json"]:
+                return pd.read_json(p)
+            else:
+                # try reading with pandas generic
+                return pd.read_csv(p)
+        except Exception as e:
+            LOG.warning("Read failed for %s: %s", p, e)
+            return pd.DataFrame()
+    else:
+        LOG.info("File not found: %s", p)
+        return pd.DataFrame()
+
+def table_columns(path):
+    """Column names from the file header/schema only (no data read)."""
+    p = resolve_table(path)
+    if p.suffix.lower() == ".parquet":
+        import pyarrow.parquet as pq
+        return list(pq.read_schema(p).names)
+    elif p.suffix.lower() in [".arrow",".feather"]:
+        import pyarrow as pa
+        with pa.memory_map(str(p)) as src:
+            return list(pa.ipc.open_file(src).schema.names)
+    elif p.suffix.lower() == ".json":
+        return list(pd.read_json(p).columns)
+    return list(pd.read_csv(p, nrows=0).columns)
+
+def iter_chunks(path, chunk_rows=200000, columns=None):
+    """Yield a table in DataFrame chunks without loading it whole; `columns` is pushed into the reader."""
+    p = resolve_table(path)
+    if p.suffix.lower() == ".parquet":
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(p).iter_batches(batch_size=chunk_rows, columns=columns):
+            yield batch.to_pandas()
+    elif p.suffix.lower() in [".arrow",".feather"]:
+        import pyarrow as pa
+        # memory-mapped IPC file: only the batch being converted is materialised
+        with pa.memory_map(str(p)) as src:
+            reader = pa.ipc.open_file(src)
+            for i in range(reader.num_record_batches):
+                batch = reader.get_batch(i)
+                if columns is not None:
+                    batch = batch.select(columns)
+                for start in range(0, batch.num_rows, chunk_rows):
+                    yield batch.slice(start, chunk_rows).to_pandas()
+    elif p.suffix.lower() == ".json":
+        df = pd.read_json(p)
+        yield df[columns] if columns is not None else df
+    else:
+        yield from pd.read_csv(p, chunksize=chunk_rows, usecols=columns)
+
+class LazyTable:
+    """A table on disk that is not read until needed.
+
+    Steps record the columns they need with require()/require_where(); only
+    those (in file order) are read, via usecols for CSV and column selection
+    for Parquet/Arrow. With nothing required, every column is read.
+    """
+
+    def __init__(self, path):
+        self.path = resolve_table(path)
+        self.required = None
+        self._columns = None
+
+    def exists(self):
+        return self.path.exists()
+
+    def columns(self):
+        if self._columns is None:
+            self._columns = table_columns(self.path)
+        return self._columns
+
+    def require(self, cols):
+        wanted = set(self.required or []) | set(cols)
+        self.required = [c for c in self.columns() if c in wanted]
+        return self
+
+    def require_where(self, predicate):
+        return self.require([c for c in self.columns() if predicate(c)])
+
+    def chunks(self, chunk_rows=200000):
+        return iter_chunks(self.path, chunk_rows, columns=self.required)
+
+    def load(self):
+        return pd.concat(list(self.chunks()), ignore_index=True)
@@ -0,0 +1,114 @@
+# scripts/model/causal_forest.py
+# Causal Forest modelling stage. Forest size, subsampling and parallelism come
+# from the environment (CF_*); the feature matrix is written once as a float32
+# .npy and memory-mapped, effects are predicted in CF_BATCH_ROWS-row batches, and
+# the fitted forest is saved with joblib together with its input columns and
+# robust scaler, so new raw samples are encoded and scaled the same way and
+# scored without retraining:  python -m scripts.model.causal_forest MODEL IN.csv OUT.csv
+import argparse
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from scripts.utils import LOG, env, setup
+
+def forest_params():
+    n = int(env("CF_N_ESTIMATORS", 400))
+    return {
+        "n_estimators": max(4, n - n % 4),  # grf trains trees in subforests of 4
+        "max_samples": float(env("CF_MAX_SAMPLES", 0.45)),
+        "min_samples_leaf": int(env("CF_MIN_SAMPLES_LEAF", 5)),
+        "n_jobs": int(env("CF_N_JOBS", -1)),
+        "random_state": int(env("CF_RANDOM_STATE", 0)),
+    }
+
+def batch_rows():
+    return int(env("CF_BATCH_ROWS", 50000))
+
+def encode(df, columns, features=None, fill_text="Unknown"):
+    """One-hot the text columns of df[columns] as float; missing text becomes fill_text.
+
+    Training (features=None) drops the first level of each column; scoring aligns the
+    result to the training `features`, levels unseen in training ending up as all zeros.
+    """
+    X = df[list(columns)].copy()
+    for c in X.columns:
+        if not pd.api.types.is_numeric_dtype(X[c]) or pd.api.types.is_bool_dtype(X[c]):
+            X[c] = X[c].astype("string").fillna(fill_text)
+    X = pd.get_dummies(X, drop_first=features is None).astype(float)
+    return X if features is None else X.reindex(columns=features, fill_value=0.0)
+
+def to_memmap(X, path):
+    """Write X (DataFrame or array) as float32 <path> and return it memory-mapped."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    values = X.to_numpy(dtype=np.float32) if isinstance(X, pd.DataFrame) else np.asarray(X, dtype=np.float32)
+    np.save(path, values)
+    return np.load(path, mmap_mode="r")
+
+def fit_forest(X, T, Y, **params):
+    """Fit econml's GRF CausalForest; params override forest_params()."""
+    from econml.grf import CausalForest
+    params = {**forest_params(), **params}
+    LOG.info("Fitting CausalForest on %d rows x %d features: %s", len(X), X.shape[1], params)
+    return CausalForest(**params).fit(np.asarray(X), np.asarray(T, dtype=float), np.asarray(Y, dtype=float))
+
+def predict_effects(forest, X, rows=None):
+    """Treatment effect per row of X (array or memmap), predicted batch by batch."""
+    rows = rows or batch_rows()
+    out = np.empty(len(X), dtype=np.float64)
+    for start in range(0, len(X), rows):
+        block = np.asarray(X[start:start + rows], dtype=np.float64)
+        out[start:start + len(block)] = forest.predict(block).ravel()
+    return out
+
+def save_forest(forest, path, features, columns=None, scaler=None):
+    """Save the forest with its feature names and, for scoring raw samples, the input
+    columns given to encode() and the fitted RobustParams."""
+    import joblib
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    joblib.dump({"forest": forest, "features": list(features),
+                 "columns": list(columns) if columns is not None else None, "scaler": scaler}, path)
+    LOG.info("Saved forest to %s", path)
+    return path
+
+def load_forest(path):
+    """The bundle saved by save_forest: forest, features, columns and scaler."""
+    import joblib
+    return joblib.load(path)
+
+def prepare(bundle, df):
+    """Training-time encoding and scaling of raw samples, as float32 like the training matrix."""
+    features = bundle["features"]
+    if bundle.get("columns") is not None:
+        missing = [c for c in bundle["columns"] if c not in df.columns]
+        if missing:
+            raise ValueError(f"input lacks model columns: {missing}")
+        X = encode(df, bundle["columns"], features)
+    else:  # older bundles: the caller passes encoded features
+        X = df.reindex(columns=features).apply(pd.to_numeric, errors="coerce")
+    if bundle.get("scaler") is not None:
+        X = bundle["scaler"].transform(X)
+    return X.fillna(0).to_numpy(dtype=np.float32)
+
+def score(path, df):
+    """ITEs for new raw samples with a saved forest (encoded and scaled as in training)."""
+    bundle = load_forest(path)
+    return predict_effects(bundle["forest"], prepare(bundle, df))
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Score new samples with a saved Causal Forest")
+    ap.add_argument("model")
+    ap.add_argument("input", help="CSV/Parquet with the model's raw input columns")
+    ap.add_argument("output", help="CSV written with an ITE column added")
+    args = ap.parse_args(argv)
+    src = Path(args.input)
+    df = pd.read_parquet(src) if src.suffix == ".parquet" else pd.read_csv(src, low_memory=False)
+    df["ITE"] = score(args.model, df)
+    df.to_csv(args.output, index=False)
+    LOG.info("Scored %d rows -> %s", len(df), args.output)
+    return 0
+
+if __name__ == "__main__":
+    setup()
+    raise SystemExit(main())
@@ -0,0 +1,90 @@
+# scripts/orchestrate.py
+# In-process replacement for the serial run_all.sh chain: every source fetch is a
+# task in a small dependency graph, independent tasks run on a bounded thread pool.
+import argparse
+import importlib
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from scripts.utils import LOG, ensure_dirs, env, setup
+
+class Task:
+    def __init__(self, name, func, deps=()):
+        self.name = name
+        self.func = func
+        self.deps = list(deps)
+
+def _module_main(module):
+    # import lazily so each heavy dependency is loaded once, inside its own task
+    return lambda: importlib.import_module(module).main()
+
+def build_graph():
+    fetches = ["tcga", "geo", "cptac", "tcia", "pride", "nhanes"]
+    tasks = [Task(name, _module_main(f"scripts.download.download_{name}")) for name in fetches]
+    tasks.append(Task("etl", _module_main("scripts.etl.etl_brain"), deps=fetches))
+    return {t.name: t for t in tasks}
+
+def run_graph(tasks, workers=4):
+    """Run tasks as soon as their deps have succeeded; returns {name: (status, seconds)}."""
+    for t in tasks.values():
+        missing = [d for d in t.deps if d not in tasks]
+        if missing:
+            raise ValueError(f"Task {t.name} depends on unknown tasks {missing}")
+    results = {}
+    pending = dict(tasks)
+    running = {}
+
+    def timed(task):
+        start = time.perf_counter()
+        try:
+            task.func()
+        finally:
+            task.elapsed = time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while pending or running:
+            for name, t in list(pending.items()):
+                dep_status = [results.get(d, (None,))[0] for d in t.deps]
+                if any(s in ("failed", "skipped") for s in dep_status):
+                    LOG.warning("Skipping %s: upstream task failed", name)
+                    results[name] = ("skipped", 0.0)
+                    del pending[name]
+                elif all(s == "ok" for s in dep_status):
+                    LOG.info("Starting %s", name)
+                    running[pool.submit(timed, t)] = t
+                    del pending[name]
+            if not running:
+                if pending:
+                    raise ValueError(f"Dependency cycle among tasks {sorted(pending)}")
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in done:
+                t = running.pop(fut)
+                try:
+                    fut.result()
+                    results[t.name] = ("ok", t.elapsed)
+                    LOG.info("Finished %s in %.1fs", t.name, t.elapsed)
+                except Exception as e:
+                    results[t.name] = ("failed", t.elapsed)
+                    LOG.exception("Task %s failed after %.1fs: %s", t.name, t.elapsed, e)
+    return results
+
+def report(results, total):
+    LOG.info("Task timings (wall):")
+    for name, (status, secs) in results.items():
+        LOG.info("  %-8s %-8s %7.1fs", name, status, secs)
+    LOG.info("  %-8s %-8s %7.1fs", "total", "", total)
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Fetch all sources concurrently, then run the ETL")
+    ap.add_argument("--workers", type=int, default=int(env("FETCH_WORKERS", 4)),
+                    help="max concurrent tasks (default: $FETCH_WORKERS or 4)")
+    args = ap.parse_args(argv)
+    ensure_dirs()
+    start = time.perf_counter()
+    results = run_graph(build_graph(), workers=args.workers)
+    report(results, time.perf_counter() - start)
+    return 0 if all(s == "ok" for s, _ in results.values()) else 1
+
+if __name__ == "__main__":
+    setup()
+    raise SystemExit(main())
@@ -0,0 +1,265 @@
+# scripts/pipeline.py
+# Declarative pipeline: named stages with declared inputs, outputs and params.
+# A stage's cache key hashes its input files, its params and the source of the
+# code it runs (function-level, read with ast, no import needed). When the key
+# matches the last run the stage is skipped; when it matches an older run the
+# outputs are restored from .cache/pipeline/<stage>/<key>/. Download stages have
+# no inputs: their key also carries the current PIPELINE_REFRESH period (one day
+# by default) so they fetch again once per period, and their raw outputs are
+# not snapshotted. Dependencies are inferred from inputs/outputs and the graph
+# runs on scripts.orchestrate.
+import argparse
+import ast
+import hashlib
+import importlib
+import importlib.util
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+from scripts.utils import LOG, ensure_dirs, env, setup
+from scripts.orchestrate import Task, run_graph, report
+
+def cache_root():
+    return Path(env("PIPELINE_CACHE", ".cache/pipeline"))
+
+class Stage:
+    def __init__(self, name, target, inputs=(), outputs=(), params=None, kwargs=None, code=None,
+                 refresh=None, snapshot=True):
+        self.name = name
+        self.target = target  # "package.module:function"
+        self.inputs = [Path(p) for p in inputs]
+        self.outputs = [Path(p) for p in outputs]
+        self.params = params or {}
+        self.kwargs = kwargs or {}
+        self.code = code or [target]
+        self.refresh = refresh  # seconds; the key changes once per period
+        self.snapshot = snapshot  # keep a copy of the outputs under cache_root()
+
+    def func(self):
+        module, fn = self.target.split(":")
+        return getattr(importlib.import_module(module), fn)
+
+# -------------------------
+# Hashing
+# -------------------------
+_file_hashes = {}
+
+def _load_file_hashes():
+    p = cache_root() / "file_hashes.json"
+    if p.exists() and not _file_hashes:
+        _file_hashes.update(json.loads(p.read_text()))
+
+def _save_file_hashes():
+    cache_root().mkdir(parents=True, exist_ok=True)
+    tmp = cache_root() / "file_hashes.json.tmp"
+    tmp.write_text(json.dumps(_file_hashes))
+    os.replace(tmp, cache_root() / "file_hashes.json")
+
+def file_digest(path):
+    """sha256 of a file, memoised on (size, mtime) so big inputs are hashed once."""
+    st = path.stat()
+    stamp = f"{st.st_size}:{st.st_mtime_ns}"
+    hit = _file_hashes.get(str(path))
+    if hit and hit[0] == stamp:
+        return hit[1]
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(1024 * 1024), b""):
+            h.update(chunk)
+    _file_hashes[str(path)] = [stamp, h.hexdigest()]
+    return h.hexdigest()
+
+def path_digest(path):
+    if path.is_dir():
+        files = sorted(f for f in path.rglob("*") if f.is_file())
+        return {str(f.relative_to(path)): file_digest(f) for f in files}
+    return file_digest(path) if path.exists() else None
+
+def code_digest(ref):
+    """Hash the source of 'module' or of one top-level def/class/assignment 'module:name'."""
+    module, _, name = ref.partition(":")
+    src = Path(importlib.util.find_spec(module).origin).read_text(encoding="utf-8")
+    if name:
+        def defines(n):
+            if isinstance(n, (ast.FunctionDef, ast.ClassDef)):
+                return n.name == name
+            return isinstance(n, ast.Assign) and any(getattr(t, "id", None) == name for t in n.targets)
+        node = next((n for n in ast.parse(src).body if defines(n)), None)
+        if node is None:
+            raise ValueError(f"{name} not found in {module}")
+        src = ast.get_source_segment(src, node)
+    return hashlib.sha256(src.encode()).hexdigest()
+
+def stage_key(stage):
+    payload = {
+        "params": stage.params,
+        "kwargs": stage.kwargs,
+        "code": {ref: code_digest(ref) for ref in stage.code},
+        "inputs": {str(p): path_digest(p) for p in stage.inputs},
+    }
+    if stage.refresh:
+        payload["period"] = int(time.time() // stage.refresh)
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+# -------------------------
+# Output snapshots
+# -------------------------
+def _copy(src, dest):
+    if src.is_dir():
+        if dest.exists():
+            shutil.rmtree(dest)
+        shutil.copytree(src, dest)
+    else:
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copy2(src, dest)
+
+def _snapshot(stage, key):
+    snap = cache_root() / stage.name / key
+    tmp = snap.with_name(key + ".tmp")
+    if tmp.exists():
+        shutil.rmtree(tmp)
+    for out in stage.outputs:
+        _copy(out, tmp / out)
+    if snap.exists():
+        shutil.rmtree(snap)
+    os.replace(tmp, snap)
+    old = sorted((d for d in snap.parent.iterdir() if d.is_dir() and d != snap),
+                 key=lambda d: d.stat().st_mtime)
+    for d in old[:max(0, len(old) - (int(env("PIPELINE_KEEP", 2)) - 1))]:
+        shutil.rmtree(d)
+
+def _restore(stage, key):
+    snap = cache_root() / stage.name / key
+    for out in stage.outputs:
+        _copy(snap / out, out)
+
+def run_stage(stage, force=False):
+    key = stage_key(stage)
+    last_file = cache_root() / stage.name / "last"
+    last = last_file.read_text().strip() if last_file.exists() else None
+    have_outputs = all(p.exists() for p in stage.outputs)
+    if not force and last == key and have_outputs:
+        LOG.info("[%s] up to date (%s)", stage.name, key)
+        return "cached"
+    if not force and (cache_root() / stage.name / key).is_dir():
+        _restore(stage, key)
+        last_file.write_text(key)
+        LOG.info("[%s] restored outputs for %s from cache", stage.name, key)
+        return "restored"
+    LOG.info("[%s] running (%s)", stage.name, key)
+    stage.func()(**stage.kwargs)
+    if not all(p.exists() for p in stage.outputs):
+        LOG.warning("[%s] finished without all outputs %s; not cached", stage.name, stage.outputs)
+        return "ran"
+    if stage.snapshot:
+        _snapshot(stage, key)
+    last_file.parent.mkdir(parents=True, exist_ok=True)
+    last_file.write_text(key)
+    return "ran"
+
+# -------------------------
+# Pipeline definition
+# -------------------------
+COHORTS = {
+    "tcga": "data/TCGA",
+    "geo": "data/GEO",
+    "cptac": "data/CPTAC",
+    "tcia": "data/TCIA",
+    "pride": "data/EXTERNAL/pride",
+    "nhanes": "data/EXTERNAL/nhanes",
+}
+ETL = "scripts.etl.etl_brain"
+# inputs of the process_<cohort> stages: a directory of tables or a single table.
+# GEO has none (SOFT files and the expression matrix); NHANES is the merged Parquet
+# built by nhanes_ingest from the .XPT downloads.
+PROCESS_INPUTS = {
+    "tcga": "data/TCGA",
+    "cptac": "data/CPTAC",
+    "tcia": "data/TCIA",
+    "pride": "data/EXTERNAL/pride",
+    "nhanes": "data/EXTERNAL/nhanes_parquet/nhanes_merged.parquet",
+}
+# modules a download stage runs besides its own (part of the stage's code hash)
+DOWNLOAD_CODE = {
+    "geo": ["scripts.download.geo_ingest", "scripts.etl.expr_matrix"],
+    "pride": ["scripts.download.pride_client"],
+}
+
+def process_cohort(cohort, source):
+    from scripts.etl.cohort import process_cohort_dir
+    process_cohort_dir(cohort, Path(source))
+
+def build_pipeline():
+    stages = []
+    refresh = int(env("PIPELINE_REFRESH", 86400))
+    for src, outdir in COHORTS.items():
+        module = f"scripts.download.download_{src}"
+        # downloaders are incremental/idempotent; raw data is not copied into the cache
+        stages.append(Stage(f"download_{src}", f"{module}:main", outputs=[outdir],
+                            code=[module, *DOWNLOAD_CODE.get(src, [])], refresh=refresh, snapshot=False))
+    for cohort, source in PROCESS_INPUTS.items():
+        stages.append(Stage(f"process_{cohort}", "scripts.pipeline:process_cohort",
+                            inputs=[source], outputs=[f"results/{cohort}_processed.parquet"],
+                            kwargs={"cohort": cohort, "source": source},
+                            code=["scripts.pipeline:process_cohort", "scripts.etl.cohort"]))
+    stages += [
+        Stage("nhanes_ingest", "scripts.etl.nhanes:main",
+              inputs=["data/EXTERNAL/nhanes"], outputs=["data/EXTERNAL/nhanes_parquet"],
+              code=["scripts.etl.nhanes"]),
+        Stage("etl_join", f"{ETL}:run_join",
+              inputs=[*COHORTS.values(), "data/EXTERNAL/nhanes_parquet"], outputs=["results/brain_cancer_joined"],
+              code=[f"{ETL}:run_join", f"{ETL}:join_sources", f"{ETL}:needs", f"{ETL}:geo_expression",
+                    f"{ETL}:is_protein_col", f"{ETL}:rename_proteins", f"{ETL}:keep", f"{ETL}:proteins",
+                    f"{ETL}:GEO_MATRIX", f"{ETL}:GEO_GENES", f"{ETL}:NHANES", f"{ETL}:NHANES_COLUMNS",
+                    f"{ETL}:prepare_nhanes", "scripts.etl.join", "scripts.etl.sources"]),
+        Stage("etl_scale", f"{ETL}:run_scale",
+              inputs=["results/brain_cancer_joined"], outputs=["results/brain_cancer_scaled"],
+              code=[f"{ETL}:run_scale", f"{ETL}:fit_and_scale", f"{ETL}:_numeric_block", f"{ETL}:keep",
+                    "scripts.etl.scalers"]),
+        Stage("etl_save", f"{ETL}:run_save",
+              inputs=["results/brain_cancer_scaled"], outputs=["results/brain_cancer_etl.csv"],
+              code=[f"{ETL}:run_save", f"{ETL}:save"]),
+    ]
+    return {s.name: s for s in stages}
+
+def _under(a, b):
+    return a == b or b in a.parents or a in b.parents
+
+def infer_deps(stages):
+    """Stage B depends on A when one of B's inputs overlaps one of A's outputs."""
+    return {b.name: [a.name for a in stages.values() if a is not b
+                     and any(_under(i, o) for i in b.inputs for o in a.outputs)]
+            for b in stages.values()}
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Run the pipeline, skipping stages whose inputs, params and code are unchanged")
+    ap.add_argument("--workers", type=int, default=int(env("FETCH_WORKERS", 4)))
+    ap.add_argument("--force", nargs="*", default=None, metavar="STAGE",
+                    help="re-run these stages even if cached (no names: all)")
+    ap.add_argument("--list", action="store_true", help="print stages and dependencies")
+    args = ap.parse_args(argv)
+    stages = build_pipeline()
+    deps = infer_deps(stages)
+    if args.list:
+        for name, d in deps.items():
+            print(f"{name:<18} <- {', '.join(d) or '-'}")
+        return 0
+    force_all = args.force == []
+    force = set(args.force or [])
+    ensure_dirs()
+    _load_file_hashes()
+    tasks = {name: Task(name, lambda s=s: run_stage(s, force_all or s.name in force), deps[name])
+             for name, s in stages.items()}
+    start = time.perf_counter()
+    try:
+        results = run_graph(tasks, workers=args.workers)
+    finally:
+        _save_file_hashes()
+    report(results, time.perf_counter() - start)
+    return 0 if all(s == "ok" for s, _ in results.values()) else 1
+
+if __name__ == "__main__":
+    setup()
+    raise SystemExit(main())
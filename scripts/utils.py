@@ -1,13 +1,16 @@
 # scripts/utils.py
 import os
 import logging
+import threading
 from pathlib import Path
-from dotenv import load_dotenv
-
-load_dotenv()
 
 LOG = logging.getLogger("brain_etl")
-logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+def setup():
+    """Load .env and configure logging; called by entry points, never on import."""
+    from dotenv import load_dotenv
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
 
 def ensure_dirs():
     base = Path.cwd()
@@ -18,3 +21,269 @@ def ensure_dirs():
 
 def env(key, default=None):
     return os.environ.get(key, default)
+
+# -------------------------
+# Shared HTTP session
+# -------------------------
+# One process-wide requests.Session: its adapter keeps a keep-alive pool per host
+# (up to HTTP_POOL_HOSTS hosts, HTTP_POOL_SIZE connections each), so repeated
+# calls to GDC/PRIDE/CDC reuse TCP+TLS connections instead of reconnecting.
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+_session = None
+_session_lock = threading.Lock()
+
+def http_session():
+    global _session
+    with _session_lock:
+        if _session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            from urllib3.util.retry import Retry
+            retry = Retry(
+                total=int(env("HTTP_RETRIES", 5)),
+                backoff_factor=float(env("HTTP_BACKOFF", 0.5)),
+                status_forcelist=RETRY_STATUSES,
+                allowed_methods=frozenset(["GET", "HEAD"]),
+                respect_retry_after_header=True,
+                raise_on_status=False,  # hand the last response back so callers can check status_code
+            )
+            adapter = HTTPAdapter(
+                pool_connections=int(env("HTTP_POOL_HOSTS", 16)),
+                pool_maxsize=int(env("HTTP_POOL_SIZE", 32)),
+                max_retries=retry,
+            )
+            s = requests.Session()
+            s.mount("https://", adapter)
+            s.mount("http://", adapter)
+            _session = s
+    return _session
+
+def http_timeout():
+    """Default (connect, read) timeout in seconds."""
+    return (float(env("HTTP_CONNECT_TIMEOUT", 10)), float(env("HTTP_READ_TIMEOUT", 60)))
+
+def http_get(url, timeout=None, **kwargs):
+    return http_session().get(url, timeout=timeout or http_timeout(), **kwargs)
+
+def http_head(url, timeout=None, **kwargs):
+    return http_session().head(url, timeout=timeout or http_timeout(), **kwargs)
+
+class RateLimiter:
+    """At most `rate` calls per second across threads (evenly spaced; 0 = unlimited)."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        import time
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+# -------------------------
+# Metadata response cache
+# -------------------------
+# Responses of metadata GETs (GDC queries, PRIDE listings, ...) are kept under
+# HTTP_CACHE (default .cache/http) keyed by URL + params. Within HTTP_CACHE_TTL
+# seconds (default 3600; 0 disables the cache) they are served from disk; after
+# that they are revalidated with If-None-Match / If-Modified-Since and a 304
+# keeps the stored body.
+def http_cache_dir():
+    return Path(env("HTTP_CACHE", ".cache/http"))
+
+def http_cache_ttl():
+    return float(env("HTTP_CACHE_TTL", 3600))
+
+def _cache_key(*parts):
+    import hashlib
+    import json
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+def _atomic_write(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+def _cached_response(url, meta, body):
+    import requests
+    from requests.structures import CaseInsensitiveDict
+    r = requests.Response()
+    r.url = url
+    r.status_code = meta["status"]
+    r.headers = CaseInsensitiveDict(meta["headers"])
+    r.encoding = meta.get("encoding")
+    r._content = body
+    r.from_cache = True
+    return r
+
+def http_get_cached(url, params=None, ttl=None, limiter=None, **kwargs):
+    """http_get through the on-disk cache; only 200 responses are stored.
+
+    `limiter` (a RateLimiter) is waited on only when the network is used.
+    """
+    import json
+    import time
+    ttl = http_cache_ttl() if ttl is None else ttl
+    if ttl <= 0:
+        if limiter:
+            limiter.wait()
+        return http_get(url, params=params, **kwargs)
+    key = _cache_key(url, params)
+    meta_path = http_cache_dir() / key[:2] / f"{key}.json"
+    body_path = meta_path.with_suffix(".body")
+    meta = None
+    if meta_path.exists() and body_path.exists():
+        try:
+            meta = json.loads(meta_path.read_text())
+        except ValueError:
+            meta = None
+    if meta and time.time() - meta["stored_at"] < ttl:
+        return _cached_response(url, meta, body_path.read_bytes())
+    headers = dict(kwargs.pop("headers", None) or {})
+    if meta:
+        if meta["headers"].get("ETag"):
+            headers["If-None-Match"] = meta["headers"]["ETag"]
+        if meta["headers"].get("Last-Modified"):
+            headers["If-Modified-Since"] = meta["headers"]["Last-Modified"]
+    if limiter:
+        limiter.wait()
+    r = http_get(url, params=params, headers=headers, **kwargs)
+    if r.status_code == 304 and meta:
+        meta["stored_at"] = time.time()
+        _atomic_write(meta_path, json.dumps(meta).encode())
+        LOG.debug("Revalidated %s", url)
+        return _cached_response(url, meta, body_path.read_bytes())
+    if r.status_code == 200:
+        keep = ("Content-Type", "ETag", "Last-Modified")
+        meta = {"url": url, "params": params, "status": 200, "stored_at": time.time(), "encoding": r.encoding,
+                "headers": {h: r.headers[h] for h in keep if h in r.headers}}
+        _atomic_write(body_path, r.content)
+        _atomic_write(meta_path, json.dumps(meta, default=str).encode())
+    return r
+
+def cached_call(name, func, *args, ttl=None, **kwargs):
+    """Memoise a library call (e.g. cptac.list_datasets) on disk for `ttl` seconds, keyed by name + args."""
+    import pickle
+    import time
+    ttl = http_cache_ttl() if ttl is None else ttl
+    if ttl <= 0:
+        return func(*args, **kwargs)
+    key = _cache_key(name, args, kwargs)
+    path = http_cache_dir() / "calls" / f"{key}.pkl"
+    if path.exists() and time.time() - path.stat().st_mtime < ttl:
+        try:
+            return pickle.loads(path.read_bytes())
+        except Exception as e:
+            LOG.warning("Ignoring unreadable cache entry for %s: %s", name, e)
+    result = func(*args, **kwargs)
+    _atomic_write(path, pickle.dumps(result))
+    return result
+
+# -------------------------
+# Typed table output
+# -------------------------
+# TABLE_FORMATS=parquet (default) writes <stem>.parquet; "parquet,csv" also keeps the CSV.
+def table_formats():
+    return [f.strip() for f in env("TABLE_FORMATS", "parquet").split(",") if f.strip()]
+
+def apply_schema(df, schema=None, numeric=None, text="string"):
+    """Cast df to an explicit schema ({col: pandas dtype}).
+
+    Columns not in the schema: object columns become `text` (nested lists/dicts are
+    JSON-encoded first), numeric columns become `numeric` when given.
+    """
+    import json
+    import pandas as pd
+    schema = dict(schema or {})
+    for c in df.columns:
+        if c in schema:
+            continue
+        if df[c].dtype == object:
+            if df[c].map(lambda v: isinstance(v, (list, dict))).any():
+                df[c] = df[c].map(lambda v: json.dumps(v) if isinstance(v, (list, dict)) else v)
+            schema[c] = text
+        elif numeric and pd.api.types.is_numeric_dtype(df[c]) and not pd.api.types.is_bool_dtype(df[c]):
+            schema[c] = numeric
+    for c, t in schema.items():
+        if c not in df.columns or df[c].dtype != object:
+            continue
+        # strings from JSON APIs: parse rather than fail the cast
+        if str(t).startswith("datetime"):
+            df[c] = pd.to_datetime(df[c], errors="coerce")
+        elif pd.api.types.is_numeric_dtype(pd.api.types.pandas_dtype(t)):
+            df[c] = pd.to_numeric(df[c], errors="coerce")
+    return df.astype({c: t for c, t in schema.items() if c in df.columns})
+
+def write_table(df, path, schema=None, numeric=None):
+    """Write df under path's stem in TABLE_FORMATS; returns the paths written."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    df = apply_schema(df.copy(), schema, numeric)
+    df.columns = [str(c) for c in df.columns]
+    written = []
+    formats = table_formats()
+    if "parquet" in formats:
+        try:
+            df.to_parquet(path.with_suffix(".parquet"), index=False, engine="pyarrow")
+            written.append(path.with_suffix(".parquet"))
+        except ImportError:
+            LOG.warning("pyarrow not installed; writing CSV instead of %s", path.with_suffix(".parquet"))
+            formats = formats + ["csv"]
+    if "csv" in formats:
+        df.to_csv(path.with_suffix(".csv"), index=False)
+        written.append(path.with_suffix(".csv"))
+    return written
+
+class ParquetAppender:
+    """Append DataFrame chunks to one Parquet file as row groups.
+
+    The schema is fixed by the first chunk; later chunks are aligned to it
+    (missing columns become null). The file is written under a temporary name
+    and moved into place on close(), so readers never see a partial file.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.tmp = self.path.with_name(self.path.name + ".tmp")
+        self.schema = None
+        self.rows = 0
+        self._writer = None
+
+    def append(self, df):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        if self._writer is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            self.schema = table.schema
+            self._writer = pq.ParquetWriter(self.tmp, self.schema)
+        else:
+            df = df.reindex(columns=self.schema.names)
+            table = pa.Table.from_pandas(df, schema=self.schema, preserve_index=False)
+        self._writer.write_table(table)
+        self.rows += len(df)
+
+    def close(self):
+        if self._writer is None:
+            return None
+        self._writer.close()
+        self._writer = None
+        os.replace(self.tmp, self.path)
+        return self.path
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        elif self._writer is not None:
+            self._writer.close()
+            self.tmp.unlink(missing_ok=True)
@@ -28,14 +28,22 @@ import json
 import logging
 from pathlib import Path
 from typing import List, Tuple, Dict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
 import requests
 import pandas as pd
 import numpy as np
 from sklearn.preprocessing import RobustScaler
-from scipy import stats
 import time, urllib.parse
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))  # repo root, for scripts.*
+from scripts.utils import http_get, http_get_cached, cached_call, setup
+from scripts.download.gdc_bulk import bulk_download
+from scripts.download.gdc_client import iter_hits
+from scripts.download.download_nhanes import bulk_fetch as fetch_nhanes
+from scripts.download.pride_client import iter_projects, fetch_project_files
+from scripts.etl.cohort import process_cohort_dir
+
 # Optional 3rd-party libs: GEOparse, cptac, tcia_utils, pyreadstat
 try:
     import GEOparse
@@ -64,6 +72,7 @@ for p in (RAW, RESULTS):
 # Logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s: %(message)s")
 LOG = logging.getLogger("brain_etl")
+setup()  # .env (logging is already configured above)
 
 # -------------------------
 # Helper utilities
@@ -84,44 +93,28 @@ def safe_write_bytes(path: Path, b: bytes):
 def fetch_tcga_expression(projects=["TCGA-GBM","TCGA-LGG"], outdir=RAW/"TCGA_expr"):
     outdir.mkdir(parents=True, exist_ok=True)
     LOG.info("Searching TCGA files for expression data: %s", projects)
-    base_files = "https://api.gdc.cancer.gov/files"
     # Query for files of type 'Gene Expression Quantification' (open-access)
-    filters = {
-        "op":"in",
-        "content":[{"field":"cases.project.project_id","value":projects},
-                   {"field":"files.data_type","value":["Gene Expression Quantification","Transcriptome Profiling"]}]
-    }
-    params = {"filters": json.dumps(filters), "size": 1000, "fields":"file_id,file_name,access,md5sum,cases.samples.submitter_id,cases.submitter_id"}
+    filters = {"op":"and", "content":[
+        {"op":"in", "content":{"field":"cases.project.project_id","value":projects}},
+        {"op":"in", "content":{"field":"files.data_type","value":["Gene Expression Quantification","Transcriptome Profiling"]}},
+    ]}
+    fields = "file_id,file_name,access,file_size,md5sum,cases.samples.submitter_id,cases.submitter_id"
     try:
-        r = requests.get(base_files, params=params, timeout=60)
-        r.raise_for_status()
-        j = r.json()
-        hits = j.get("data", {}).get("hits", [])
-        LOG.info("TCGA files found: %d", len(hits))
-        # For each hit, try to find a downloadable URL (data repository or gdc API)
-        for h in hits:
+        small = []
+        for h in iter_hits("files", filters, fields):
             fname = h.get("file_name")
-            file_id = h.get("file_id")
-            access = h.get("access","")
             # Skip controlled access
-            if access.lower()=="controlled":
+            if h.get("access","").lower()=="controlled":
                 LOG.info("Skipping controlled file %s", fname)
                 continue
-            # Try to download via GDC data endpoint (small files only)
-            dl_url = f"https://api.gdc.cancer.gov/data/{file_id}"
-            try:
-                r2 = requests.get(dl_url, timeout=60, stream=True)
-                if r2.status_code == 200 and int(r2.headers.get("Content-Length", "0")) < 100*1024*1024:
-                    # save streaming to file (protect memory)
-                    outp = outdir / fname
-                    with open(outp, "wb") as fh:
-                        for chunk in r2.iter_content(1024*1024):
-                            fh.write(chunk)
-                    LOG.info("Downloaded TCGA file %s", outp)
-                else:
-                    LOG.info("TCGA file %s too large or unavailable (status=%s, len=%s)", fname, r2.status_code, r2.headers.get("Content-Length"))
-            except Exception as e:
-                LOG.warning("Failed to download TCGA file %s: %s", fname, e)
+            # small files only
+            if int(h.get("file_size") or 0) >= 100*1024*1024:
+                LOG.info("TCGA file %s too large (len=%s)", fname, h.get("file_size"))
+                continue
+            small.append(h)
+        LOG.info("TCGA files to fetch: %d", len(small))
+        # concurrent, md5-verified, stored once in the content-addressed store
+        bulk_download(small, outdir, outdir / "manifest.csv")
         # List downloaded csv/tsv
         downloaded = list(outdir.glob("*"))
         LOG.info("TCGA expr downloaded files: %d", len(downloaded))
@@ -140,7 +133,7 @@ def fetch_cptac_meta() -> Path:
         LOG.warning("cptac package not installed. Skipping CPTAC fetch.")
         return outdir
     try:
-        datasets = cptac.list_datasets()
+        datasets = cached_call("cptac.list_datasets", cptac.list_datasets)
         # datasets may be list or DataFrame
         if hasattr(datasets, "to_dict"):
             # DataFrame-like
@@ -168,7 +161,7 @@ def fetch_tcia_safe(collection="TCGA-GBM", outdir=RAW/"TCIA"):
     outdir.mkdir(parents=True, exist_ok=True)
     base = "https://services.cancerimagingarchive.net/services/v4/TCIA/query/getSeries"
     try:
-        r = requests.get(base, params={"Collection": collection}, timeout=10)
+        r = http_get_cached(base, params={"Collection": collection}, timeout=10)
         if r.status_code == 200:
             text = r.text
             # Save truncated xml/json
@@ -223,202 +216,27 @@ def show_csv_summary():
 # -------------------------
 ######### 修正版：PRIDE - プロジェクトメタから「実データのftpリンク」を抽出して小さなファイルを落とす #########
 def fetch_pride_and_files(query="glioblastoma", outdir=RAW/"PRIDE_files", max_projects=10):
-    outdir.mkdir(parents=True, exist_ok=True)
     LOG.info("PRIDE search for: %s", query)
-    api = "https://www.ebi.ac.uk:443/pride/ws/archive/v2/projects"
-    params = {"pageSize": 50, "page": 0, "q": query}
     projects = []
     try:
-        while True:
-            r = requests.get(api, params=params, timeout=30)
-            if r.status_code != 200:
-                LOG.warning("PRIDE API returned %s", r.status_code)
-                break
-            data = r.json()
-            items = data.get("_embedded", {}).get("projects", [])
-            projects.extend(items)
-            if data.get("_links", {}).get("next") is None or params["page"] > 10:
-                break
-            params["page"] += 1
-            time.sleep(0.1)
+        # pages and file listings are fetched concurrently under PRIDE_RATE (scripts/download/pride_client.py)
+        projects = list(iter_projects(query, page_size=50, max_pages=12))
     except Exception as e:
         LOG.exception("PRIDE search failed: %s", e)
     LOG.info("PRIDE projects found: %d", len(projects))
-    # iterate top-N projects, get files for each
-    count = 0
-    for p in projects:
-        if count >= max_projects:
-            break
-        acc = p.get("accession") or p.get("projectAccession")
-        if not acc:
-            continue
-        count += 1
-        try:
-            files_api = f"https://www.ebi.ac.uk/pride/ws/archive/file/listProjectFiles/{acc}"
-            r2 = requests.get(files_api, timeout=30)
-            if r2.status_code != 200:
-                LOG.warning("PRIDE files API %s returned %s", files_api, r2.status_code)
-                continue
-            file_items = r2.json().get("list", [])
-            # For each file, if ftpDownloadLink exists and it's small (txt/csv/tsv), download
-            for fi in file_items:
-                ftp = fi.get("ftpDownloadLink") or fi.get("downloadLink")
-                fname = fi.get("fileName") or urllib.parse.urlsplit(ftp).path.split("/")[-1] if ftp else None
-                if not ftp or not fname:
-                    continue
-                # prefer small text-like files
-                if fname.lower().endswith((".txt",".csv",".tsv",".mzid",".mzML",".gz")):
-                    outp = outdir / f"{acc}__{fname}"
-                    try:
-                        r3 = requests.get(ftp, timeout=60, stream=True)
-                        if r3.status_code == 200:
-                            # if too large (>200MB) skip
-                            clen = int(r3.headers.get("Content-Length","0"))
-                            if clen > 200*1024*1024:
-                                LOG.info("Skipping large file %s (size=%s)", fname, clen)
-                                continue
-                            with open(outp, "wb") as fh:
-                                for chunk in r3.iter_content(1024*1024):
-                                    fh.write(chunk)
-                            LOG.info("Downloaded PRIDE file %s", outp)
-                        else:
-                            LOG.warning("PRIDE file %s unreachable (status=%s)", ftp, r3.status_code)
-                    except Exception as e:
-                        LOG.warning("Failed download %s: %s", ftp, e)
-        except Exception as e:
-            LOG.exception("Failed fetching files for project %s: %s", acc, e)
+    # top-N projects; sizes come from the listing (or HEAD), files >200MB are never opened
+    accs = [a for a in (p.get("accession") or p.get("projectAccession") for p in projects) if a][:max_projects]
+    fetch_project_files(accs, outdir, max_bytes=200*1024*1024)
     return outdir
 
 # -------------------------
-# 7) Simple ETL/statistics processing function
-#    - Input: directory with CSV files or table-like files
-#    - Output: processed parquet with scaled numeric cols, zscore, binary_signif
+# 7) Simple ETL/statistics processing: process_cohort_dir (scripts/etl/cohort.py)
 # -------------------------
-def process_cohort_dir(cohort_name: str, cohort_dir: Path, out_dir: Path = RESULTS,
-                       numeric_only: bool = False, chunk_rows: int = 100000):
-    """
-    Process CSV-like tables found in cohort_dir.
-    For simplicity: find all CSV files in cohort_dir, concat (careful with memory),
-    select numeric columns, apply RobustScaler, compute zscore (per column),
-    create binary_signif column suffix _sig (|z|>2).
-    Save results to results/<cohort_name>_processed.parquet
-    """
-    out_dir.mkdir(parents=True, exist_ok=True)
-    csv_files = list(cohort_dir.glob("*.csv"))
-    if not csv_files:
-        LOG.warning("No CSV files found for cohort %s in %s", cohort_name, cohort_dir)
-        return None
-    LOG.info("Processing cohort %s with %d CSV files", cohort_name, len(csv_files))
-    # read in chunks to avoid memory explosion: accumulate numeric summary then transform
-    # Strategy: compute column-wise median and IQR across files by streaming, then scale per file
-    numeric_cols = set()
-    col_medians = {}
-    col_iqr = {}
-
-    # First pass: discover numeric columns and collect sample statistics using downsampling
-    sample_frames = []
-    for f in csv_files:
-        try:
-            # read small sample rows to infer dtypes
-            df_sample = pd.read_csv(f, nrows=1000)
-            sample_frames.append(df_sample)
-            for c in df_sample.columns:
-                if pd.api.types.is_numeric_dtype(df_sample[c]):
-                    numeric_cols.add(c)
-        except Exception as e:
-            LOG.warning("Skipping sample read for %s: %s", f, e)
-
-    numeric_cols = sorted(list(numeric_cols))
-    if not numeric_cols:
-        LOG.warning("No numeric columns found for %s. Skipping.", cohort_name)
-        return None
-    LOG.info("Identified numeric columns: %s", numeric_cols[:10])
-
-    # Compute robust stats (median, IQR) across files by sampling blocks
-    medians_accum = {c: [] for c in numeric_cols}
-    q1_accum = {c: [] for c in numeric_cols}
-    q3_accum = {c: [] for c in numeric_cols}
-
-    for f in csv_files:
-        LOG.info("Sampling for stats from %s", f)
-        try:
-            for chunk in pd.read_csv(f, usecols=numeric_cols, chunksize=50000):
-                # downsample chunk to limit memory
-                if len(chunk) > 5000:
-                    chunk = chunk.sample(2000, random_state=0)
-                for c in numeric_cols:
-                    col = chunk[c].dropna()
-                    if not col.empty:
-                        medians_accum[c].append(col.median())
-                        q1_accum[c].append(col.quantile(0.25))
-                        q3_accum[c].append(col.quantile(0.75))
-                break  # only one chunk per file for initial stats
-        except Exception as e:
-            LOG.warning("Stat sampling failed for %s: %s", f, e)
-
-    for c in numeric_cols:
-        med = np.median(medians_accum[c]) if medians_accum[c] else 0.0
-        q1 = np.median(q1_accum[c]) if q1_accum[c] else 0.0
-        q3 = np.median(q3_accum[c]) if q3_accum[c] else 0.0
-        iqr = q3 - q1 if (q3 - q1) != 0 else 1.0
-        col_medians[c] = med
-        col_iqr[c] = iqr
-
-    LOG.info("Computed medians and IQRs for %d cols", len(col_medians))
-
-    # Second pass: transform per-file and append to an output parquet (using pyarrow engine)
-    out_path = out_dir / f"{cohort_name}_processed.parquet"
-    # We'll accumulate into a list of smaller dataframes then concat write (careful with memory).
-    processed_chunks = []
-    for f in csv_files:
-        LOG.info("Transforming file %s", f)
-        try:
-            for chunk in pd.read_csv(f, chunksize=chunk_rows):
-                # select relevant columns
-                numeric_chunk = chunk[numeric_cols].copy()
-                # fill missing with median
-                for c in numeric_cols:
-                    numeric_chunk[c] = numeric_chunk[c].fillna(col_medians.get(c, 0.0))
-                # Robust scaling: (x - median) / IQR
-                for c in numeric_cols:
-                    numeric_chunk[c] = (numeric_chunk[c] - col_medians[c]) / col_iqr[c]
-                # compute zscore (standardization)
-                z_chunk = numeric_chunk.apply(lambda col: stats.zscore(col, nan_policy='omit'))
-                # add suffix columns
-                for c in numeric_cols:
-                    zc = z_chunk[c]
-                    chunk[f"{c}_z"] = zc
-                    chunk[f"{c}_sig"] = zc.abs() > 2.0
-                # append processed chunk (drop original large non-numeric columns to save memory)
-                # Keep identifier columns if present
-                id_cols = [c for c in chunk.columns if "id" in c.lower() or c.lower() in ("patient_id","sample_id")]
-                keep_cols = id_cols + [col for c in numeric_cols for col in (c, f"{c}_z", f"{c}_sig")]
-                keep_cols = [c for c in keep_cols if c in chunk.columns]
-                processed_chunks.append(chunk[keep_cols].reset_index(drop=True))
-                # flush to disk temp if processed_chunks grows big
-                if sum(len(df) for df in processed_chunks) > 500000:
-                    # write intermediate and clear
-                    tmp_path = out_dir / f"{cohort_name}_part_{int(time.time())}.parquet"
-                    pd.concat(processed_chunks, ignore_index=True).to_parquet(tmp_path, index=False)
-                    LOG.info("Flushed intermediate parquet %s", tmp_path)
-                    processed_chunks = []
-        except Exception as e:
-            LOG.exception("Processing chunk failed for %s: %s", f, e)
-
-    # Final merge of all processed chunks
-    if processed_chunks:
-        final_df = pd.concat(processed_chunks, ignore_index=True)
-        final_df.to_parquet(out_path, index=False)
-        LOG.info("Saved processed cohort parquet: %s (rows=%d cols=%d)", out_path, len(final_df), final_df.shape[1])
-    else:
-        LOG.warning("No processed data chunks produced for %s", cohort_name)
-        final_df = None
-    return out_path
 
 # -------------------------
 # Main runner orchestrating fetch + process
 # -------------------------
-def main():
+def main(workers: int = 1):
     LOG.info("=== START: Fetch public brain-cancer datasets (no keys) and process ===")
     # 1) TCGA metadata
     try:
@@ -452,7 +270,7 @@ def main():
 
     # 6) NHANES sample
     try:
-        fetch_nhanes_sample("2017-2018", ["DEMO","BMX"])
+        fetch_nhanes(["2017-2018"], ["DEMO","BMX"], outdir=RAW / "NHANES")
     except Exception as e:
         LOG.exception("NHANES fetch failed: %s", e)
 
@@ -467,15 +285,28 @@ def main():
         "nhanes": RAW / "NHANES"
     }
 
-    for cohort, dpath in cohort_dirs.items():
+    def process(cohort, dpath, executor):
         try:
-            process_cohort_dir(cohort, dpath)
+            process_cohort_dir(cohort, dpath, executor=executor)
         except Exception as e:
             LOG.exception("Processing failed for cohort %s: %s", cohort, e)
 
+    if workers <= 1:
+        for cohort, dpath in cohort_dirs.items():
+            process(cohort, dpath, None)
+    else:
+        # cohorts run side by side (threads); their files share one process pool
+        with ProcessPoolExecutor(max_workers=workers) as pool, \
+             ThreadPoolExecutor(max_workers=len(cohort_dirs)) as cohorts:
+            list(cohorts.map(lambda item: process(*item, pool), cohort_dirs.items()))
+
 #  --- main の最後に追加 ---
     LOG.info("=== COMPLETE ===")
     show_csv_summary()
 
 if __name__ == "__main__":
-    main()
+    import argparse
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--workers", type=int, default=int(os.environ.get("PROCESS_WORKERS", os.cpu_count() or 1)),
+                    help="process pool size for cohort processing (1 = serial)")
+    main(ap.parse_args().workers)
@@ -1,5 +1,11 @@
 import os
-import requests
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))  # repo root, for scripts.*
+from scripts.utils import http_get, setup
+
+setup()  # .env + logging
 
 DATA_SOURCES = {
     "TCGA_GBM": "https://tcga-data.nci.nih.gov/tcga_gbm_clinical.csv",
@@ -13,7 +19,7 @@ os.makedirs("testdir/raw", exist_ok=True)
 
 def download_file(url, dest):
     print(f"Downloading {url}")
-    r = requests.get(url)
+    r = http_get(url)
     if r.status_code == 200:
         with open(dest, "wb") as f:
             f.write(r.content)
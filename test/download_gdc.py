@@ -1,9 +1,14 @@
-import requests
-import json
 import pandas as pd
 import os
-import time
-from tqdm import tqdm
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))  # repo root, for scripts.*
+from scripts.download.gdc_bulk import bulk_download
+from scripts.download.gdc_client import iter_hits
+from scripts.utils import setup
+
+setup()  # .env + logging
 
 # =============================
 # 設定
@@ -11,6 +16,7 @@ from tqdm import tqdm
 PROJECT = "TCGA-BRCA"  # 任意のプロジェクト
 DATA_TYPE = "Gene Expression Quantification"
 SAVE_DIR = "GDC_download"
+WORKERS = int(os.environ.get("GDC_WORKERS", 8))  # 同時ダウンロード数
 os.makedirs(SAVE_DIR, exist_ok=True)
 
 # =============================
@@ -18,134 +24,30 @@ os.makedirs(SAVE_DIR, exist_ok=True)
 # =============================
 print(f"🔍 {PROJECT} のメタデータを取得中...")
 
-url = "https://api.gdc.cancer.gov/files"
-params = {
-    "filters": json.dumps({
-        "op": "and",
-        "content": [
-            {"op": "in", "content": {"field": "cases.project.project_id", "value": [PROJECT]}},
-            {"op": "in", "content": {"field": "data_type", "value": [DATA_TYPE]}},
-            {"op": "in", "content": {"field": "data_format", "value": ["TXT", "TSV", "CSV", "htseq.counts"]}}
-        ]
-    }),
-    "fields": "file_id,file_name,cases.submitter_id,data_format,data_type,cases.samples.sample_type",
-    "format": "JSON",
-    "size": "1000"
+filters = {
+    "op": "and",
+    "content": [
+        {"op": "in", "content": {"field": "cases.project.project_id", "value": [PROJECT]}},
+        {"op": "in", "content": {"field": "data_type", "value": [DATA_TYPE]}},
+        {"op": "in", "content": {"field": "data_format", "value": ["TXT", "TSV", "CSV", "htseq.counts"]}}
+    ]
 }
+fields = "file_id,file_name,file_size,md5sum,cases.submitter_id,data_format,data_type,cases.samples.sample_type"
 
-response = requests.get(url, params=params, timeout=60)
-response.raise_for_status()
-files = response.json()["data"]["hits"]
+files = list(iter_hits("files", filters, fields))  # 全ページ取得（1000件で打ち切らない）
 print(f"✅ {len(files)} 件のファイルが見つかりました。")
 
 # =============================
-# 2. 安全ダウンロード関数
-# =============================
-def safe_download(file_id, save_path, max_retries=5, chunk_size=8192):
-    """
-    中断時に再試行し、部分ダウンロード再開も可能な安全ダウンローダー
-    """
-    dl_url = f"https://api.gdc.cancer.gov/data/{file_id}"
-    retries = 0
-
-    while retries < max_retries:
-        try:
-            headers = {}
-            downloaded_bytes = os.path.getsize(save_path) if os.path.exists(save_path) else 0
-
-            # ファイルの全体サイズ確認用 HEAD リクエスト
-            head = requests.head(dl_url, timeout=30)
-            total_size = int(head.headers.get("content-length", 0))
-
-            # ファイルが完全にあるならスキップ
-            if downloaded_bytes >= total_size > 0:
-                print(f"✅ 既に完全にダウンロード済み: {save_path}")
-                return True
-
-            # 再開用ヘッダ
-            if downloaded_bytes > 0:
-                headers["Range"] = f"bytes={downloaded_bytes}-"
-
-            with requests.get(dl_url, stream=True, headers=headers, timeout=120) as r:
-                if r.status_code == 416:
-                    print(f"⚠️ {file_id}: ファイルはすでに完全にダウンロード済み (416)。スキップします。")
-                    return True
-
-                r.raise_for_status()
-                total_to_download = int(r.headers.get("content-length", 0)) + downloaded_bytes
-
-                mode = "ab" if downloaded_bytes > 0 else "wb"
-                with open(save_path, mode) as f:
-                    pbar = tqdm(
-                        total=total_to_download,
-                        initial=downloaded_bytes,
-                        unit="B",
-                        unit_scale=True,
-                        desc=os.path.basename(save_path)
-                    )
-
-                    for chunk in r.iter_content(chunk_size=chunk_size):
-                        if chunk:
-                            f.write(chunk)
-                            pbar.update(len(chunk))
-                    pbar.close()
-
-            return True  # 正常終了
-
-        except requests.exceptions.HTTPError as e:
-            if e.response is not None and e.response.status_code == 416:
-                print(f"⚠️ {file_id}: 416エラー（ファイル完全）。スキップします。")
-                return True
-            retries += 1
-            print(f"⚠️ HTTPエラー {e}. 再試行 {retries}/{max_retries}")
-            time.sleep(5 * retries)
-
-        except (requests.exceptions.ConnectionError,
-                requests.exceptions.Timeout,
-                requests.exceptions.ChunkedEncodingError) as e:
-            retries += 1
-            wait = 5 * retries
-            print(f"⚠️ 接続中断 ({retries}/{max_retries}) - {e}. {wait}s後に再試行。")
-            time.sleep(wait)
-
-    print(f"❌ {file_id} のダウンロードに失敗しました。")
-    return False
-
-
-
-# =============================
-# 3. 一括ダウンロード
+# 2. 並列・再開可能な一括ダウンロード
+#    マニフェストは1ファイルごとに更新される（中断後は続きから再開）
 # =============================
-records = []
-for f in files:
-    file_id = f["file_id"]
-    file_name = f["file_name"]
-    sample_id = f["cases"][0]["submitter_id"] if f["cases"] else "Unknown"
-    local_path = os.path.join(SAVE_DIR, file_name)
-
-    print(f"\n⬇️ {file_name} をダウンロード中...")
-    ok = safe_download(file_id, local_path)
-
-    records.append({
-        "file_id": file_id,
-        "file_name": file_name,
-        "sample_id": sample_id,
-        "data_type": f.get("data_type"),
-        "data_format": f.get("data_format"),
-        "local_path": local_path,
-        "status": "success" if ok else "failed"
-    })
-
-# =============================
-# 4. 結果をDataFrame化・保存
-# =============================
-df = pd.DataFrame(records)
 meta_path = os.path.join(SAVE_DIR, f"{PROJECT}_metadata.csv")
-df.to_csv(meta_path, index=False)
+records = bulk_download(files, SAVE_DIR, meta_path, workers=WORKERS)
 print(f"\n💾 メタデータを保存しました → {meta_path}")
 
 # 失敗ファイル一覧表示
-failed = df[df["status"] == "failed"]
+df = pd.DataFrame(records)
+failed = df[df["status"] != "success"]
 if not failed.empty:
     print("\n⚠️ ダウンロードに失敗したファイルがあります:")
-    print(failed[["file_id", "file_name"]])
+    print(failed[["file_id", "file_name", "status"]])
@@ -3,6 +3,10 @@ import pandas as pd
 from pathlib import Path
 import numpy as np
 import logging
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))  # repo root, for scripts.*
+from scripts.etl.clean import clean_df as _clean_df
 
 # ログ設定
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s: %(message)s")
@@ -12,14 +16,9 @@ RAW = Path("raw")
 PROCESSED = Path("processed")
 PROCESSED.mkdir(exist_ok=True)
 
-# 欠損値整形関数
+# 欠損値整形関数（数値列は中央値、それ以外は "NA"。scripts/etl/clean.py の一括処理）
 def clean_df(df: pd.DataFrame) -> pd.DataFrame:
-    for col in df.columns:
-        if pd.api.types.is_numeric_dtype(df[col]):
-            df[col] = df[col].fillna(df[col].median())
-        else:
-            df[col] = df[col].fillna("NA")
-    return df
+    return _clean_df(df, fill_text="NA")
 
 # すべての脳腫瘍データを格納するリスト
 all_brain_dfs = []
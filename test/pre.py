@@ -1,7 +1,15 @@
+import sys
+from pathlib import Path
 import pandas as pd
 import numpy as np
-from sklearn.preprocessing import RobustScaler
-from econml.grf import CausalForest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))  # repo root, for scripts.*
+from scripts.utils import setup
+from scripts.etl.clean import clean_df
+from scripts.etl.scalers import get_or_fit
+from scripts.model.causal_forest import encode, fit_forest, predict_effects, save_forest, to_memmap
+
+setup()  # .env (CF_N_JOBS, CF_N_ESTIMATORS, CF_MAX_SAMPLES, CF_BATCH_ROWS ...) + logging
 
 # ========================
 # 1. データ読み込み
@@ -13,17 +21,8 @@ geo_df = pd.read_csv(geo_file, low_memory=False)
 nhanes_df = pd.read_csv(nhanes_file)
 
 # ========================
-# 2. 欠損値処理関数
+# 2. 欠損値処理（scripts/etl/clean.py: 数値列は中央値、文字列列は 'Unknown'、低カーディナリティ列は category）
 # ========================
-def clean_df(df):
-    # 数値列は中央値で補完
-    df_numeric = df.select_dtypes(include=[np.number])
-    df[df_numeric.columns] = df_numeric.fillna(df_numeric.median())
-    # 文字列列は 'Unknown' で補完
-    df_str = df.select_dtypes(include=['object'])
-    df[df_str.columns] = df_str.fillna('Unknown')
-    return df
-
 geo_df = clean_df(geo_df)
 nhanes_df = clean_df(nhanes_df)
 
@@ -52,24 +51,28 @@ if T_col not in df.columns:
 # ========================
 # 5. 説明変数整形
 # ========================
-X = pd.get_dummies(df[X_cols], drop_first=True)
+X = encode(df, X_cols)  # get_dummies(drop_first=True)。採点時も同じ符号化を使う
 T = df[T_col].astype(int)
 Y = df[Y_col].astype(float)
 
-# Robust scaling
-scaler = RobustScaler()
-X_scaled = scaler.fit_transform(X)
+# Robust scaling（保存済みスケーラーを再利用）。outer merge で空いたセルは中央値 (=0) で埋める
+scaler = get_or_fit("causal_forest_X", X.columns, [X])
+X_scaled = scaler.transform(X).fillna(0)
+# 特徴量行列は float32 の .npy に一度だけ書き出し、メモリマップで読む
+X_mm = to_memmap(X_scaled, "processed_data/causal_forest_X.npy")
 
 # ========================
-# 6. Causal Forest 学習
+# 6. Causal Forest 学習（n_jobs / 木の数 / サブサンプル率は CF_* 環境変数）
 # ========================
-cf = CausalForest()
-cf.fit(Y.values, T.values, X_scaled)
+train = (Y.notna() & T.notna()).to_numpy()  # アウトカムのない行は学習に使わない
+cf = fit_forest(X_mm[train], T.to_numpy()[train], Y.to_numpy()[train])
+# 列・スケーラーも一緒に保存し、再学習せずに生の新規サンプルを採点できる
+save_forest(cf, "processed_data/causal_forest.joblib", X.columns, columns=X_cols, scaler=scaler)
 # ========================
 # 7. 個別処置効果(ITE)と平均処置効果(ATE)
 # ========================
-ite = cf.effect(X_scaled)   # 個別処置効果
-ate = ite.mean()            # 平均処置効果
+ite = predict_effects(cf, X_mm)   # 個別処置効果（CF_BATCH_ROWS 行ずつ）
+ate = ite.mean()                  # 平均処置効果
 print("Average Treatment Effect (ATE):", ate)
 
 # ========================
@@ -1,6 +1,11 @@
 import os
+import sys
+from pathlib import Path
 import pandas as pd
-from sklearn.preprocessing import RobustScaler
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))  # repo root, for scripts.*
+from scripts.etl.scalers import get_or_fit
+from scripts.etl.clean import clean_df
 
 # 出力先ディレクトリ
 output_dir = "processed_data"
@@ -21,14 +26,13 @@ for name, file_path in data_files.items():
     # CSV 読み込み
     df = pd.read_csv(file_path)
     
-    # 欠損値処理: NaN を "NA" に置換
-    df = df.fillna("NA")
+    # 欠損値処理: 数値列は中央値、文字列列は "NA"（数値列を object にしない）
+    df = clean_df(df, fill_text="NA")
     
-    # もし数値カラムだけ Robust Scaling したければ別途
-    num_cols = df.select_dtypes(include=["int64", "float64"]).columns
+    # もし数値カラムだけ Robust Scaling したければ別途（保存済みスケーラーを再利用、SCALER_REFIT=1 で再学習）
+    num_cols = df.select_dtypes(include="number").columns
     if len(num_cols) > 0:
-        scaler = RobustScaler()
-        df[num_cols] = scaler.fit_transform(df[num_cols])
+        df = get_or_fit(Path(file_path).stem, num_cols, [df]).transform(df)  # キーは入力テーブル名
     
     # 整形後 CSV 保存
     output_file = os.path.join(output_dir, f"{name}_processed.csv")
@@ -1,49 +1,63 @@
-import GEOparse
+import sys
+from pathlib import Path
 import pandas as pd
-from sklearn.preprocessing import RobustScaler
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))  # repo root, for scripts.*
+from scripts.etl.scalers import get_or_fit
+from scripts.etl.clean import clean_df
+from scripts.etl.phenotype import PhenotypeStore
+from scripts.download.geo_ingest import ingest, read_phenotype
 
 # --- 1. GEO データの取得と整形 ---
 # 脳がん関連の GEO シリーズ例を設定
 geo_series_list = ["GSE4290", "GSE50161"]  # 必要に応じて追加
-geo_dfs = []
+# プロトコル文はサイドテーブルに1回だけ保存、繰り返し文字列は category で保持
+pheno_store = PhenotypeStore()
+
+# 並列ダウンロード＋プロセスプールで解析。SOFT のチェックサムが同じなら Parquet キャッシュを読むだけ
+print(f"Downloading {', '.join(geo_series_list)} ...")
+geo_caches = ingest(geo_series_list, destdir="./GEOdata")
+
+for gse_id, cache in geo_caches.items():
+    if cache is None:
+        continue
 
-for gse_id in geo_series_list:
-    print(f"Downloading {gse_id} ...")
-    gse = GEOparse.get_GEO(geo=gse_id, destdir="./GEOdata", silent=True)
-    
     # サンプルメタデータ取得
-    sample_data = gse.phenotype_data.copy()
+    sample_data = read_phenotype(cache)
     
-    # 欠損値処理
-    sample_data = sample_data.fillna("NA")
+    # 欠損値処理（数値列は中央値、文字列列は "NA"、診断名などは category）
+    sample_data = clean_df(sample_data, fill_text="NA")
     
     # 特定列を整理（例: 病理診断を統一）
     if 'characteristics_ch1.0.Histopathological diagnostic' in sample_data.columns:
-        sample_data['histology'] = sample_data['characteristics_ch1.0.Histopathological diagnostic'].str.upper()
+        sample_data['histology'] = sample_data['characteristics_ch1.0.Histopathological diagnostic'].str.upper().astype("category")
     
-    geo_dfs.append(sample_data)
+    pheno_store.add(gse_id, sample_data)
 
-# GEO の全シリーズを結合
-geo_combined = pd.concat(geo_dfs, axis=0, ignore_index=True)
+# GEO の全シリーズを結合（union_categoricals で category のまま）
+geo_combined = pheno_store.frame()
 
 # --- 2. NHANES データ読み込み ---
 nhanes_data = pd.read_csv("./processed_data/NHANES_processed.csv")
 
 # --- 3. Robust Scaling ---
-scaler = RobustScaler()
+# テーブルごとに別のスケーラー（中央値/IQR）を一度だけ学習して保存し、次回以降は再利用
+# （再学習するには SCALER_REFIT=1）。キーは出力テーブル名: procces_data.py の
+# 生データ用スケーラー（GSE4290_pheno / nhanes_blood_sample）とは共有しない
 
 # GEO の数値列のみスケーリング
 geo_numeric_cols = geo_combined.select_dtypes(include='number').columns.tolist()
 if geo_numeric_cols:
-    geo_combined[geo_numeric_cols] = scaler.fit_transform(geo_combined[geo_numeric_cols])
+    geo_combined = get_or_fit("GEO_brain_cancer", geo_numeric_cols, [geo_combined]).transform(geo_combined)
 
 # NHANES の数値列のみスケーリング
 nhanes_numeric_cols = nhanes_data.select_dtypes(include='number').columns.tolist()
 if nhanes_numeric_cols:
-    nhanes_data[nhanes_numeric_cols] = scaler.fit_transform(nhanes_data[nhanes_numeric_cols])
+    nhanes_data = get_or_fit("NHANES_scaled", nhanes_numeric_cols, [nhanes_data]).transform(nhanes_data)
 
 # --- 4. データ保存 ---
 geo_combined.to_csv("./processed/GEO_brain_cancer.csv", index=False)
+pheno_store.protocol_table().to_csv("./processed/GEO_brain_cancer_protocols.csv", index=False)  # プロトコル列のキー (P0000...) の本文
 nhanes_data.to_csv("./processed/NHANES_scaled.csv", index=False)
 
 print("GEO と NHANES の整形・スケーリングが完了しました。")